@@ -0,0 +1,120 @@
+"""Compare pymoai transports on the command path.
+
+Issues small json POSTs, shaped like `Commands.run`, through every transport. Each
+transport runs sequentially (per-call overhead) and from a thread pool (throughput
+under concurrency).
+
+By default a local HTTP/1.1 stand-in server is started, which measures client-side
+overhead. HTTP/2 multiplexing only shows against a server speaking h2, so pass `--url`
+to benchmark a real moai deployment:
+
+    python benchmarks/bench_transport.py --calls 2000 --concurrency 32
+    python benchmarks/bench_transport.py --url https://api.montops.ai/healthstatus
+"""
+import argparse
+import http.server
+import json
+import socket
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from pymoai.transport import make_transport, transports
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    """Minimal stand-in for the moai command endpoint."""
+
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        """Disable Nagle, so headers and body are not held back by delayed acks."""
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def do_POST(self):
+        """Answer every command with a fixed json payload."""
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        data = json.dumps({"stdout": "ok", "stderr": ""}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_POST
+
+    def log_message(self, *args):
+        """Silence request logging."""
+
+
+def start_stand_in() -> str:
+    """Start the local stand-in server and return the command url."""
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{httpd.server_port}/moai/"
+
+
+def bench(name: str, url: str, calls: int, concurrency: int) -> Optional[dict]:
+    """Run the sequential and concurrent passes for one transport."""
+    try:
+        transport = make_transport(name, pool_size=concurrency)
+    except ImportError as e:
+        print(f"skipping {name}: {e}")
+        return None
+
+    body = {"args": ["metastore", "list", "-b", "default"]}
+
+    def call() -> float:
+        start = time.perf_counter()
+        res = transport.request("POST", url, json=body, timeout=(10, 30))
+        res.json()
+        return time.perf_counter() - start
+
+    # warm up connection pools
+    for _ in range(10):
+        call()
+
+    latencies = [call() for _ in range(calls)]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(lambda _: call(), range(calls)))
+    elapsed = time.perf_counter() - start
+
+    transport.close()
+    return {
+        "transport": name,
+        "p50 ms": statistics.median(latencies) * 1000,
+        "p99 ms": statistics.quantiles(latencies, n=100)[98] * 1000,
+        "calls/s": calls / elapsed,
+    }
+
+
+def main():
+    """Parse arguments and print a comparison table."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="endpoint to call, a local stand-in if unset")
+    parser.add_argument("--calls", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--transports", nargs="+", default=list(transports))
+    args = parser.parse_args()
+
+    url = args.url or start_stand_in()
+    results = [
+        bench(name, url, args.calls, args.concurrency) for name in args.transports
+    ]
+
+    print(f"{'transport':<10} {'p50 ms':>8} {'p99 ms':>8} {'calls/s':>10}")
+    for r in results:
+        if r is not None:
+            print(
+                f"{r['transport']:<10} {r['p50 ms']:>8.3f} {r['p99 ms']:>8.3f} "
+                f"{r['calls/s']:>10.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -45,9 +45,15 @@ class Commands:
     def __init__(self, client: "MoaiClient"):
         """Create a new Commands class."""
         self.client = client
+        if client.spool is not None:
+            client.spool.register("command", self.__deliver_spooled)
 
     def run(
-        self, task: str, args: Optional[list[str]] = None
+        self,
+        task: str,
+        args: Optional[list[str]] = None,
+        idempotent: bool = False,
+        spool: bool = False,
     ) -> Union[str, Any, ApiError]:
         """
         Execute single command with task and args.
@@ -56,23 +62,53 @@ class Commands:
             task (str): task to issue to the remote moai server.
             df (:ob: `pandas.DataFrame`): A pandas dataframe
             args (list[str], optional): The args for the task command.
+            idempotent (bool, optional): Retry on transient failures. Only set this
+                for read-only commands, or commands that are safe to run twice.
+            spool (bool, optional): Write the command to the client's local spool and
+                return at once; it is delivered in the background, and its output is
+                not returned. Requires a client created with `spool=True`.
 
         Returns:
-            Any
+            Any, or {spooled: str} with the idempotency key of the entry if `spool`
+            is set
         """
-        args = args or []
-
-        url = f"{self.client.base_url}/moai/"
-
-        auth_headers = self.client.get_auth_headers(with_json=True)
-        auth_headers = self.client.add_org_header(headers=auth_headers)
-
-        args = [task, *args]
+        args = [task, *(args or [])]
         cmd_args = CommandArgs(args=args)
 
-        res = requests.post(url, json=cmd_args.dict(), headers={**auth_headers})
+        if spool:
+            if self.client.spool is None:
+                raise ValueError("Spooling requires a client created with spool=True.")
+            key = self.client.spool.put("command", cmd_args.dict())
+            return {"spooled": key}
+
+        res = self.__post(cmd_args, idempotent=idempotent)
 
         logger.debug(f"Moai command response: {res}")
 
         response = handlers.handle_response(res)
         return response
+
+    def __post(
+        self,
+        cmd_args: CommandArgs,
+        idempotent: bool = False,
+        headers: Optional[dict[str, str]] = None,
+    ) -> requests.Response:
+        url = f"{self.client.base_url}/moai/"
+
+        auth_headers = self.client.get_auth_headers(with_json=True)
+        auth_headers = self.client.add_org_header(headers=auth_headers)
+
+        return self.client.request(
+            "POST",
+            url,
+            idempotent=idempotent,
+            json=cmd_args.dict(),
+            headers={**auth_headers, **(headers or {})},
+        )
+
+    def __deliver_spooled(self, payload: dict[str, Any], key: str) -> requests.Response:
+        # the idempotency key lets the server drop duplicate deliveries, so the
+        # command is safe to retry
+        cmd_args = CommandArgs(args=payload["args"])
+        return self.__post(cmd_args, idempotent=True, headers={"Idempotency-Key": key})
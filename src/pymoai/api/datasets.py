@@ -15,17 +15,32 @@ Classes:
     Datasets
 """
 import io
+import json
 import logging
+import os
 import pathlib
-from typing import TYPE_CHECKING, Any, Callable, Optional
+import threading
+import urllib.parse
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, BinaryIO, Callable, List, Optional
 
 import pandas as pd
 import requests
+from dacite import from_dict
 from requests_toolbelt.multipart.encoder import (
     MultipartEncoder,
     MultipartEncoderMonitor,
 )
 
+from pymoai import handlers
+from pymoai.api.dtypes import shrunk_dtypes
+from pymoai.api.incremental import RowIndex
+from pymoai.api.s3 import S3DirectUpload
+from pymoai.api.uploads import UploadHandle, stratified_sample
+from pymoai.exceptions import ApiResponseError, UploadCancelledError
+from pymoai.schemas import ApiError, DatasetInfo, DatasetSchema, DatasetVersion
+
 if TYPE_CHECKING:
     from pymoai.client import MoaiClient
 
@@ -49,6 +64,14 @@ class Datasets:
     def __init__(self, client: "MoaiClient"):
         """Create a new Datasets class."""
         self.client = client
+        self.s3 = S3DirectUpload(client)
+        self.__executor = ThreadPoolExecutor(
+            max_workers=2, thread_name_prefix="pymoai-upload"
+        )
+        if client.spool is not None:
+            client.spool.register(
+                "upload", self.__deliver_spooled, discard=self.__discard_spooled
+            )
 
     def __get_df_size(self, df: pd.DataFrame):
         try:
@@ -57,6 +80,14 @@ class Datasets:
             # size is not essential
             return None
 
+    def __get_schema(self, df: pd.DataFrame) -> DatasetSchema:
+        size = self.__get_df_size(df)
+        return DatasetSchema(
+            columns=shrunk_dtypes(df),
+            rows=len(df),
+            size=int(size) if size is not None else None,
+        )
+
     def __get_mime_type(self, ext: str = ".csv"):
         if ext == ".csv":
             return "text/csv"
@@ -80,6 +111,19 @@ class Datasets:
             pass
         return read_func
 
+    def __text_fields(self, fields: dict[str, str]):
+        return {
+            k: (v, io.BytesIO(bytes(v, "utf-8")), "text/plain")
+            for k, v in fields.items()
+        }
+
+    def __listed(self, res: Any, key: str) -> List[dict]:
+        # listings are a list of objects, optionally wrapped in a `key` object
+        items = res.get(key, []) if isinstance(res, dict) else res
+        if not isinstance(items, list) or not all(isinstance(i, dict) for i in items):
+            raise ApiResponseError(error=handlers.handle_unknown_response(str(res)))
+        return items
+
     def __convert_df_to_bytes(self, df: pd.DataFrame, ext: str = ".csv") -> io.BytesIO:
         if ext == ".csv":
             data = io.BytesIO(df.to_csv(index=False).encode("utf-8"))
@@ -93,6 +137,54 @@ class Datasets:
         data.seek(0)
         return data
 
+    def __upload(
+        self,
+        filename: str,
+        data: BinaryIO,
+        target: str,
+        fields: dict[str, str],
+        ext: str = ".csv",
+        callback: Optional[Callable[[MultipartEncoderMonitor], None]] = None,
+        retry: bool = True,
+        headers: Optional[dict[str, str]] = None,
+    ) -> requests.Response:
+        url = f"{self.client.base_url}/upload"
+
+        def send() -> requests.Response:
+            # the encoder consumes its fields, so rebuild it for every attempt
+            data.seek(0)
+            e = MultipartEncoder(
+                fields={
+                    **self.__text_fields(fields),
+                    "file": (filename, data, self.__get_mime_type(ext)),
+                    "target": (
+                        target,
+                        io.BytesIO(bytes(target, "utf-8")),
+                        "text/plain",
+                    ),
+                }
+            )
+            m = MultipartEncoderMonitor(e, callback or default_monitor)
+
+            auth_headers = self.client.get_auth_headers()
+            auth_headers = self.client.add_org_header(headers=auth_headers)
+
+            return self.client.transport.request(
+                "POST",
+                url,
+                data=m,
+                headers={
+                    **auth_headers,
+                    **(headers or {}),
+                    "Content-type": e.content_type,
+                },
+                timeout=self.client.timeout,
+            )
+
+        # without an idempotency key a replay could store the dataset twice
+        idempotent = "Idempotency-Key" in (headers or {})
+        return self.client.send(send, idempotent=idempotent, retry=retry)
+
     def add(
         self,
         path_or_name: str,
@@ -101,6 +193,15 @@ class Datasets:
         store_s3: bool = False,
         df_read_args: Optional[dict[str, Any]] = None,
         callback: Optional[Callable[[MultipartEncoderMonitor], None]] = None,
+        retry: bool = True,
+        incremental: bool = False,
+        key_columns: Optional[List[str]] = None,
+        shrink: bool = False,
+        exclude_columns: Optional[List[str]] = None,
+        preview: bool = False,
+        preview_rows: int = 10_000,
+        spool: bool = False,
+        direct_s3: bool = False,
         **kwargs,
     ):
         """
@@ -122,6 +223,38 @@ class Datasets:
                 that every moai server includes.
             df_read_args (dict[str, Any], optional): If df is not defined, then
                 optionally pass in pandas read_* kwargs.
+            callback (Callable, optional): Upload progress monitor.
+            retry (bool, optional): Replay the upload when the connection could not
+                be opened, using the client's retry policy. Uploads that may have
+                reached the server are not replayed. Defaults to True.
+            incremental (bool, optional): Only upload rows not uploaded before under
+                this dataset name, and have the moai server append them to the latest
+                version. Uploaded rows are tracked in a local index under
+                `Configuration.temp_dir`; the first incremental upload for a name
+                sends the whole frame.
+            key_columns (list[str], optional): With `incremental`, the columns that
+                identify a row. Defaults to all columns. Key columns must be present
+                in the dataset and cannot be excluded.
+            shrink (bool, optional): Send the smallest lossless dtype of every
+                column, with the row count and size, as a `schema` field so the moai
+                server can parse the upload into compact dtypes without inferring
+                them. The uploaded data itself is unchanged.
+            exclude_columns (list[str], optional): Columns dropped before upload.
+            preview (bool, optional): Upload a sample stratified on `target` first,
+                marked with a `preview` field, and return an `UploadHandle` as soon
+                as the server accepted it. The full dataset is uploaded in the
+                background; use the handle to wait for or cancel it. If the preview
+                is rejected, `ApiResponseError` is raised and nothing else is sent.
+                Frames of at most `preview_rows` rows are uploaded once, and the
+                returned handle is already done.
+            preview_rows (int, optional): Approximate size of the preview sample.
+            spool (bool, optional): Write the upload to the client's local spool and
+                return at once; it is delivered in the background. Requires a client
+                created with `spool=True`. With `incremental`, rows are indexed once
+                the upload is delivered.
+            direct_s3 (bool, optional): With `store_s3`, upload the data straight to
+                the bucket in parallel parts, using a grant from the moai server,
+                instead of streaming it through the server.
             **kwargs: If kwargs are provided, they will be serialized to dict[str, str]
                 and passed to the upload server as is. This is useful because it allows
                 passing additional fields to any pipelines or triggers configured to
@@ -132,7 +265,28 @@ class Datasets:
                 path: str,
                 **kwargs
             }
+
+            or an `UploadHandle` wrapping that response if `preview` is set, or
+            {
+                path: str,
+                spooled: str,
+                **kwargs
+            }
+            with the idempotency key of the entry if `spool` is set
         """
+        if spool and self.client.spool is None:
+            raise ValueError("Spooling requires a client created with spool=True.")
+        if spool and preview:
+            raise ValueError("Spooled uploads cannot be previewed.")
+        if direct_s3 and not store_s3:
+            raise ValueError("Direct uploads require store_s3=True.")
+        if direct_s3 and spool:
+            raise ValueError("Direct uploads cannot be spooled.")
+        if key_columns and exclude_columns:
+            excluded_keys = sorted(set(key_columns) & set(exclude_columns))
+            if excluded_keys:
+                raise ValueError(f"Key columns cannot be excluded: {excluded_keys}")
+
         filename = path_or_name
 
         # READ
@@ -166,38 +320,228 @@ class Datasets:
         callback = callback or default_monitor
 
         target = target or "default"
-        extra = {}
-        if kwargs is not None:
-            extra = {
-                k: (str(v), io.BytesIO(bytes(str(v), "utf-8")), "text/plain")
-                for k, v in kwargs.items()
-            }
+        extra = {k: str(v) for k, v in (kwargs or {}).items()}
 
         filename = f"/s3/{filename}" if store_s3 else f"/datasets/{filename}"
 
-        data = self.__convert_df_to_bytes(df, ext=write_ext)
-
-        # stream = StreamingIterator(size, data)
-
-        e = MultipartEncoder(
-            fields={
-                **extra,
-                "file": (filename, data, self.__get_mime_type(write_ext)),
-                "target": (target, io.BytesIO(bytes(target, "utf-8")), "text/plain"),
+        if incremental and key_columns:
+            missing_keys = sorted(set(key_columns) - set(df.columns))
+            if missing_keys:
+                raise ValueError(f"Key columns not found in dataset: {missing_keys}")
+
+        if exclude_columns:
+            df = df.drop(columns=exclude_columns)
+
+        index, hashes = None, None
+        if incremental:
+            index = self.row_index(filename, key_columns)
+            hashes = index.hash(df)
+            if index.exists:
+                unseen = index.unseen(hashes)
+                df, hashes = df[unseen], hashes[unseen]
+                if df.empty:
+                    logger.info(f"No new rows to append to {filename}")
+                    return {"path": filename, "appended": 0, **extra}
+                extra = {**extra, "mode": "append"}
+
+        if shrink:
+            extra = {**extra, "schema": json.dumps(self.__get_schema(df).dict())}
+
+        if spool and self.client.spool is not None:
+            data = self.__convert_df_to_bytes(df, ext=write_ext)
+            payload: dict[str, Any] = {
+                "filename": filename,
+                "target": target,
+                "fields": extra,
             }
+            if index is not None and hashes is not None:
+                # rows are indexed once the upload is delivered
+                staged = uuid.uuid4().hex
+                index.stage(hashes, staged)
+                payload["index"] = {
+                    "name": filename,
+                    "key_columns": key_columns,
+                    "staged": staged,
+                }
+            key = self.client.spool.put("upload", payload, body=data.getvalue())
+            return {"path": filename, "spooled": key, **extra}
+
+        if preview and len(df) <= preview_rows:
+            # the sample would be the whole frame, so it is uploaded once
+            result = self.__finish(
+                filename,
+                df,
+                target,
+                extra,
+                write_ext,
+                callback,
+                retry,
+                index,
+                hashes,
+                direct_s3,
+            )
+            done: Future = Future()
+            done.set_result(result)
+            return UploadHandle(result, done, threading.Event())
+
+        if preview:
+            sample = stratified_sample(df, target, preview_rows)
+            # the preview is not part of the dataset, so it is never appended
+            preview_fields = {k: v for k, v in extra.items() if k != "mode"}
+            preview_res = self.__upload(
+                filename,
+                self.__convert_df_to_bytes(sample, ext=write_ext),
+                target,
+                {**preview_fields, "preview": "true"},
+                ext=write_ext,
+                retry=retry,
+            )
+            preview_response = handlers.handle_response(preview_res)
+            if isinstance(preview_response, ApiError):
+                # the full upload would be rejected as well
+                raise ApiResponseError(error=preview_response)
+
+            cancelled = threading.Event()
+
+            def monitor(m: MultipartEncoderMonitor) -> None:
+                # aborts the streamed body at the next chunk
+                if cancelled.is_set():
+                    raise UploadCancelledError()
+                callback(m)
+
+            future = self.__executor.submit(
+                self.__finish,
+                filename,
+                df,
+                target,
+                extra,
+                write_ext,
+                monitor,
+                retry,
+                index,
+                hashes,
+                direct_s3,
+                cancelled,
+            )
+            return UploadHandle(preview_response, future, cancelled)
+
+        return self.__finish(
+            filename,
+            df,
+            target,
+            extra,
+            write_ext,
+            callback,
+            retry,
+            index,
+            hashes,
+            direct_s3,
         )
-        m = MultipartEncoderMonitor(e, callback)
 
-        url = f"{self.client.base_url}/upload"
+    def __finish(
+        self,
+        filename: str,
+        df: pd.DataFrame,
+        target: str,
+        fields: dict[str, str],
+        ext: str,
+        callback: Callable[[MultipartEncoderMonitor], None],
+        retry: bool,
+        index: Optional[RowIndex],
+        hashes: Optional[Any],
+        direct_s3: bool = False,
+        cancelled: Optional[threading.Event] = None,
+    ) -> Any:
+        data = self.__convert_df_to_bytes(df, ext=ext)
+
+        if direct_s3:
+            # raises if any step fails, so reaching the index means success
+            result = self.s3.upload(filename, data, target, fields, cancelled)
+            ok = True
+        else:
+            # stream = StreamingIterator(size, data)
+            res = self.__upload(
+                filename, data, target, fields, ext=ext, callback=callback, retry=retry
+            )
+            result, ok = res.json(), res.ok
+
+        if index is not None and hashes is not None and ok:
+            index.update(hashes)
+
+        return result
+
+    def __deliver_spooled(self, payload: dict[str, Any], key: str) -> requests.Response:
+        body_path = self.client.spool.body_path(payload) if self.client.spool else None
+        if body_path is None:
+            raise ValueError("Spooled upload is missing its body.")
+
+        with open(body_path, "rb") as data:
+            res = self.__upload(
+                payload["filename"],
+                data,
+                payload["target"],
+                payload["fields"],
+                headers={"Idempotency-Key": key},
+            )
+
+        index = payload.get("index")
+        if res.ok and index is not None:
+            self.row_index(index["name"], index["key_columns"]).commit(index["staged"])
+        return res
+
+    def __discard_spooled(self, payload: dict[str, Any], key: str) -> None:
+        # the rows were never accepted, so they must not count as uploaded
+        index = payload.get("index")
+        if index is not None:
+            self.row_index(index["name"], index["key_columns"]).discard(index["staged"])
+
+    def close(self) -> None:
+        """Wait for background uploads to finish and stop their worker threads."""
+        self.__executor.shutdown(wait=True)
+
+    def row_index(
+        self, filename: str, key_columns: Optional[List[str]] = None
+    ) -> RowIndex:
+        """Local index of rows uploaded as `filename`, e.g. `/s3/nlp_train.csv`."""
+        root = os.path.join(
+            self.client.config.temp_dir, "pymoai", "index", self.client.org_id
+        )
+        return RowIndex(filename, root, key_columns=key_columns)
 
-        auth_headers = self.client.get_auth_headers()
-        auth_headers = self.client.add_org_header(headers=auth_headers)
+    # annotations in this class use `typing.List`, as this method shadows `list`
+    def list(self) -> List[DatasetInfo]:
+        """
+        List the datasets stored on the connected moai server.
 
-        res = requests.post(
-            url, data=m, headers={**auth_headers, "Content-type": e.content_type}
-        )
+        Results are cached and revalidated with the server, so polling an unchanged
+        listing only costs a `304 Not Modified` response.
+
+        Returns:
+            list[DatasetInfo]
+        """
+        res = self.client.get_cached(f"{self.client.base_url}/datasets")
+        items = self.__listed(res, "datasets")
+        return [from_dict(data=d, data_class=DatasetInfo) for d in items]
+
+    def versions(self, name: str) -> List[DatasetVersion]:
+        """
+        List the versions of dataset `name`, oldest first.
 
-        return res.json()
+        Results are cached and revalidated with the server, so polling an unchanged
+        dataset only costs a `304 Not Modified` response.
+
+        Args:
+            name (str): the dataset name
+
+        Returns:
+            list[DatasetVersion]
+        """
+        quoted = urllib.parse.quote(name, safe="")
+        res = self.client.get_cached(
+            f"{self.client.base_url}/datasets/{quoted}/versions"
+        )
+        items = self.__listed(res, "versions")
+        return [from_dict(data=v, data_class=DatasetVersion) for v in items]
 
 
 def default_monitor(monitor: MultipartEncoderMonitor) -> None:
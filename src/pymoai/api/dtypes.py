@@ -0,0 +1,72 @@
+"""Helpers to find the smallest lossless dtypes of a dataframe.
+
+Frames often arrive with default 64 bit numerics and free-form object columns. The
+narrowest dtype every column fits in is sent to the moai server as a schema, so it can
+parse uploads into compact dtypes without inferring them.
+
+Uploads are serialized as csv text, which is the same for every dtype of a value, so
+the schema does not make uploads smaller, and the uploaded data is never converted.
+A float column is only reported as float32 if every value is exactly representable,
+so the server parses the float64 text back to the same values.
+
+Functions:
+    shrunk_dtypes(df, category_threshold) -> dict[str, str]
+"""
+import numpy as np
+import pandas as pd
+
+INT_DTYPES = (np.int8, np.int16, np.int32, np.int64)
+UINT_DTYPES = (np.uint8, np.uint16, np.uint32, np.uint64)
+
+
+def shrunk_dtypes(df: pd.DataFrame, category_threshold: float = 0.5) -> dict[str, str]:
+    """
+    Smallest lossless dtype of every column.
+
+    Numeric columns are downcast to the narrowest type holding all their values, and
+    string columns with few distinct values are reported as categoricals. Columns are
+    inspected without being converted.
+
+    Args:
+        df (:ob: `pandas.DataFrame`): A pandas dataframe, left unchanged
+        category_threshold (float, optional): Largest ratio of distinct values to
+            rows for a string column to become categorical.
+
+    Returns:
+        dict[str, str]: dtype names keyed by column name
+    """
+    return {
+        str(name): _shrunk_dtype(col, category_threshold) for name, col in df.items()
+    }
+
+
+def _shrunk_dtype(col: pd.Series, category_threshold: float) -> str:
+    if pd.api.types.is_bool_dtype(col) or len(col) == 0:
+        return str(col.dtype)
+    if pd.api.types.is_unsigned_integer_dtype(col):
+        return _smallest_int(col, UINT_DTYPES)
+    if pd.api.types.is_integer_dtype(col):
+        return _smallest_int(col, INT_DTYPES)
+    if pd.api.types.is_float_dtype(col):
+        return _shrunk_float(col)
+    if pd.api.types.infer_dtype(col, skipna=True) == "string":
+        if col.nunique(dropna=True) / len(col) <= category_threshold:
+            return "category"
+    return str(col.dtype)
+
+
+def _smallest_int(col: pd.Series, candidates: tuple) -> str:
+    low, high = col.min(), col.max()
+    for dtype in candidates:
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return np.dtype(dtype).name
+    return str(col.dtype)
+
+
+def _shrunk_float(col: pd.Series) -> str:
+    values = col.to_numpy()
+    narrowed = values.astype(np.float32)
+    if np.array_equal(narrowed.astype(values.dtype), values, equal_nan=True):
+        return np.dtype(np.float32).name
+    return str(col.dtype)
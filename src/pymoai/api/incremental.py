@@ -0,0 +1,156 @@
+"""RowIndex Class used to track rows already uploaded for a dataset name.
+
+Append-only tables only grow, so re-uploading the whole frame for every new version
+sends mostly rows the server already has. The row index keeps a sorted array of 64 bit
+row hashes per `dataset name` on local disk. New frames are hashed in a single
+vectorised pass, and only rows whose hash is not in the index are uploaded. The moai
+server then appends them to the latest version.
+
+Rows are identified by content, or by `key_columns` if provided. With keys, a changed
+row whose key was already uploaded is not sent again. Hashes depend on values only,
+not on column dtypes or order, so a column read as float once it has missing values
+still matches the rows uploaded while it was read as int.
+
+Uploads delivered later, such as spooled uploads, stage their hashes next to the index
+and commit them once the server accepted the upload. Staged rows already count as
+seen, so they are not sent again while their upload is pending. Staged hashes of an
+upload the server rejected are discarded.
+
+Classes:
+    RowIndex
+"""
+import logging
+import os
+import re
+import threading
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+class RowIndex:
+    """
+    Local index of row hashes uploaded for a single dataset name.
+
+    Args:
+        name (str): the dataset name
+        root (str): directory holding the index files
+        key_columns (list[str], optional): columns identifying a row, all columns
+            are used if not provided
+
+    Attributes:
+        path (str): location of the index file
+        key_columns (list[str], optional): columns identifying a row
+    """
+
+    # serializes read-merge-write cycles of background uploads in this process
+    _lock = threading.Lock()
+
+    def __init__(self, name: str, root: str, key_columns: Optional[list[str]] = None):
+        """Create a new RowIndex."""
+        safe_name = re.sub(r"[^A-Za-z0-9._-]", "_", name)
+        self.path = os.path.join(root, f"{safe_name}.npy")
+        self.key_columns = key_columns
+
+    @property
+    def exists(self) -> bool:
+        """Whether rows have been indexed or staged for this dataset yet."""
+        return os.path.exists(self.path) or bool(self.__staged_paths())
+
+    def hash(self, df: pd.DataFrame) -> np.ndarray:
+        """Hash every row of `df` to a uint64, independent of column dtypes."""
+        columns = sorted(self.key_columns or df.columns, key=str)
+        canonical = pd.DataFrame(
+            {str(name): _hash_values(df[name]) for name in columns}, index=df.index
+        )
+        hashes: np.ndarray = pd.util.hash_pandas_object(
+            canonical, index=False
+        ).to_numpy()
+        return hashes
+
+    def load(self) -> np.ndarray:
+        """Load the sorted array of indexed hashes."""
+        if not os.path.exists(self.path):
+            return np.empty(0, dtype=np.uint64)
+        return np.load(self.path)
+
+    def unseen(self, hashes: np.ndarray) -> np.ndarray:
+        """Boolean mask of `hashes` neither in the index nor staged."""
+        seen = [self.load()]
+        for staged_path in self.__staged_paths():
+            try:
+                seen.append(np.load(staged_path))
+            except FileNotFoundError:
+                # committed or discarded meanwhile
+                continue
+        return ~np.isin(hashes, np.concatenate(seen))
+
+    def update(self, hashes: np.ndarray) -> None:
+        """Add `hashes` to the index, replacing the file atomically."""
+        with self._lock:
+            merged = np.union1d(self.load(), hashes.astype(np.uint64))
+            self.__save(self.path, merged)
+
+        logger.debug(f"Row index {self.path} now holds {len(merged)} rows")
+
+    def stage(self, hashes: np.ndarray, key: str) -> None:
+        """Keep `hashes` under `key` until the upload sending them is delivered."""
+        self.__save(self.__staged_path(key), hashes.astype(np.uint64))
+
+    def commit(self, key: str) -> None:
+        """Add the hashes staged under `key` to the index."""
+        staged_path = self.__staged_path(key)
+        if not os.path.exists(staged_path):
+            # already committed by an earlier delivery of the same upload
+            return
+        self.update(np.load(staged_path))
+        os.remove(staged_path)
+
+    def discard(self, key: str) -> None:
+        """Drop the hashes staged under `key`, their upload was rejected."""
+        try:
+            os.remove(self.__staged_path(key))
+        except FileNotFoundError:
+            pass
+
+    # Internal helpers
+
+    def __staged_path(self, key: str) -> str:
+        return f"{self.path[: -len('.npy')]}.{key}.staged.npy"
+
+    def __staged_paths(self) -> list[str]:
+        root, name = os.path.split(self.path[: -len(".npy")])
+        pattern = re.compile(rf"{re.escape(name)}\.[0-9a-f]{{32}}\.staged\.npy")
+        try:
+            return [
+                os.path.join(root, f) for f in os.listdir(root) if pattern.fullmatch(f)
+            ]
+        except FileNotFoundError:
+            return []
+
+    def __save(self, path: str, hashes: np.ndarray) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, hashes)
+        os.replace(tmp_path, path)
+
+
+def _hash_values(col: pd.Series) -> np.ndarray:
+    # integral floats hash as the equal integer, so numeric dtype changes keep hashes
+    if isinstance(col.dtype, np.dtype) and col.dtype.kind in "biu":
+        hashes: np.ndarray = pd.util.hash_array(col.to_numpy().astype(np.int64))
+        return hashes
+    if not pd.api.types.is_numeric_dtype(col):
+        return pd.util.hash_pandas_object(col, index=False).to_numpy()
+
+    values = col.to_numpy(dtype=np.float64, na_value=np.nan)
+    hashes = pd.util.hash_array(values)
+    # false for nan and inf
+    integral = (values == np.floor(values)) & (np.abs(values) < 2.0**63)
+    if integral.any():
+        hashes[integral] = pd.util.hash_array(values[integral].astype(np.int64))
+    return hashes
@@ -0,0 +1,301 @@
+"""S3DirectUpload Class used to upload datasets straight to the moai S3 bucket.
+
+Datasets stored in S3 would otherwise be streamed through the moai `/upload` endpoint,
+which then copies them to the bucket. With direct uploads the client asks the server
+for an upload grant, sends the parts to S3 in parallel, and only notifies the server
+once all parts are stored.
+
+The server grants either:
+
+    scoped credentials  uploaded with boto3's transfer manager, which splits the data
+                        into parts and sends them concurrently
+    presigned part urls parts are PUT concurrently through the client transport, and
+                        the server completes the multipart upload on commit
+
+If any step after the grant fails, the server is asked to abort the upload, so no
+incomplete multipart upload is left behind in the bucket. A failed commit is only
+aborted if the server rejected it. When its outcome is unknown, e.g. after a read
+timeout, the server may still have completed the upload, so it is left in place.
+
+Classes:
+    S3DirectUpload
+"""
+import io
+import logging
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Optional
+
+import boto3
+import boto3.exceptions
+import botocore.exceptions
+import requests
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from dacite import from_dict
+
+from pymoai import handlers
+from pymoai.exceptions import ApiResponseError, UploadCancelledError
+from pymoai.retry import CircuitBreaker, call_with_retry
+from pymoai.schemas import ApiError, S3UploadGrant
+
+if TYPE_CHECKING:
+    from pymoai.client import MoaiClient
+
+
+logger = logging.getLogger(__name__)
+
+
+class S3DirectUpload:
+    """
+    Upload datasets to the moai S3 bucket without proxying them through the server.
+
+    Args:
+        client (:obj: `MoaiClient`): the client used to perform remote api requests
+
+    Attributes:
+        client (:obj: `MoaiClient`): the client used to perform remote api requests
+        breaker (:obj: `CircuitBreaker`): circuit breaker for part uploads, kept
+            apart from the client's, as S3 failures say nothing about the moai server
+    """
+
+    def __init__(self, client: "MoaiClient"):
+        """Create a new S3DirectUpload class."""
+        self.client = client
+        self.breaker = CircuitBreaker(
+            failure_threshold=client.config.breaker_threshold,
+            reset_timeout=client.config.breaker_reset_timeout,
+        )
+
+    def upload(
+        self,
+        filename: str,
+        data: io.BytesIO,
+        target: str,
+        fields: dict[str, str],
+        cancelled: Optional[threading.Event] = None,
+    ) -> Any:
+        """
+        Upload `data` directly to S3 and commit it as dataset `filename`.
+
+        Args:
+            filename (str): the `/s3/` prefixed dataset path
+            data (:obj: `io.BytesIO`): the serialized dataset
+            target (str): the target column
+            fields (dict[str, str]): extra fields passed on to the server
+            cancelled (:obj: `threading.Event`, optional): set to abort the upload
+                before it is committed
+
+        Returns:
+            the server response to the commit, as for `Datasets.add`
+
+        Raises:
+            UploadCancelledError: `cancelled` was set before the commit
+        """
+        size = data.getbuffer().nbytes
+        grant = self.request_grant(filename, size, target)
+
+        try:
+            parts: list[dict[str, Any]] = []
+            if grant.credentials is not None:
+                self.upload_with_credentials(grant, data, cancelled)
+            elif grant.upload_id is not None and grant.part_urls:
+                parts = self.upload_parts(grant, data, cancelled)
+            else:
+                raise ApiResponseError(
+                    error=handlers.handle_unknown_response("S3 upload grant")
+                )
+            _check_cancelled(cancelled)
+        except BaseException:
+            self.abort(filename, grant)
+            raise
+
+        try:
+            return self.commit(filename, grant, parts, size, target, fields)
+        except ApiResponseError:
+            # the server answered and rejected the commit, other failures such as
+            # timeouts are re-raised as is, the commit may have been applied
+            self.abort(filename, grant)
+            raise
+
+    def request_grant(self, filename: str, size: int, target: str) -> S3UploadGrant:
+        """Request a grant to upload `size` bytes for dataset `filename`."""
+        # not replayed, a lost response would leave an orphaned multipart upload
+        res = self.__post(
+            "grant",
+            {
+                "filename": filename,
+                "size": size,
+                "target": target,
+                "part_size": self.client.config.s3_part_size,
+            },
+            idempotent=False,
+        )
+        return from_dict(data=res, data_class=S3UploadGrant)
+
+    def upload_with_credentials(
+        self,
+        grant: S3UploadGrant,
+        data: io.BytesIO,
+        cancelled: Optional[threading.Event] = None,
+    ) -> None:
+        """Upload using scoped credentials and boto3's parallel transfer manager."""
+        config = self.client.config
+        credentials = grant.credentials
+        if credentials is None:
+            raise ValueError("Upload grant does not include credentials.")
+
+        s3 = boto3.client(
+            "s3",
+            region_name=grant.region,
+            endpoint_url=grant.endpoint_url,
+            aws_access_key_id=credentials.AccessKeyId,
+            aws_secret_access_key=credentials.SecretAccessKey,
+            aws_session_token=credentials.SessionToken,
+            config=Config(max_pool_connections=config.s3_max_concurrency),
+        )
+        transfer_config = TransferConfig(
+            multipart_threshold=config.s3_part_size,
+            multipart_chunksize=config.s3_part_size,
+            max_concurrency=config.s3_max_concurrency,
+        )
+
+        data.seek(0)
+        try:
+            s3.upload_fileobj(
+                data,
+                grant.bucket,
+                grant.key,
+                Config=transfer_config,
+                # called as parts are read, fails the transfer once cancelled
+                Callback=lambda _: _check_cancelled(cancelled),
+            )
+        except (
+            boto3.exceptions.S3UploadFailedError,
+            botocore.exceptions.BotoCoreError,
+            botocore.exceptions.ClientError,
+        ) as e:
+            _check_cancelled(cancelled)
+            raise ApiResponseError(error=ApiError(error=f"S3 upload failed: {e}"))
+
+    def upload_parts(
+        self,
+        grant: S3UploadGrant,
+        data: io.BytesIO,
+        cancelled: Optional[threading.Event] = None,
+    ) -> list[dict[str, Any]]:
+        """PUT every part to its presigned url in parallel, returns part ETags."""
+        size = data.getbuffer().nbytes
+        part_urls = grant.part_urls or []
+        part_size = grant.part_size or self.client.config.s3_part_size
+
+        if len(part_urls) != max(1, math.ceil(size / part_size)):
+            raise ValueError(
+                f"Upload grant has {len(part_urls)} part urls for {size} bytes "
+                f"in parts of {part_size} bytes."
+            )
+
+        def put(number: int) -> dict[str, Any]:
+            _check_cancelled(cancelled)
+            start = (number - 1) * part_size
+            body = data.getbuffer()[start : start + part_size].tobytes()
+            url = part_urls[number - 1]
+
+            def send() -> requests.Response:
+                return self.client.transport.request(
+                    "PUT", url, data=body, timeout=self.client.timeout
+                )
+
+            # a part can be PUT any number of times, so it is always retried
+            res = call_with_retry(
+                send, policy=self.client.retry_policy, breaker=self.breaker
+            )
+            if not res.ok:
+                raise ApiResponseError(
+                    error=ApiError(
+                        error=f"S3 part {number} failed (Code: {res.status_code}): "
+                        f"{res.reason}"
+                    )
+                )
+            return {"PartNumber": number, "ETag": res.headers["ETag"]}
+
+        workers = min(self.client.config.s3_max_concurrency, len(part_urls))
+        with ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="pymoai-s3"
+        ) as pool:
+            return list(pool.map(put, range(1, len(part_urls) + 1)))
+
+    def commit(
+        self,
+        filename: str,
+        grant: S3UploadGrant,
+        parts: list[dict[str, Any]],
+        size: int,
+        target: str,
+        fields: dict[str, str],
+    ) -> Any:
+        """Notify the server that the upload is complete."""
+        # the object key identifies the upload, so a repeated commit can be dropped
+        return self.__post(
+            "commit",
+            {
+                **fields,
+                "filename": filename,
+                "target": target,
+                "size": size,
+                "bucket": grant.bucket,
+                "key": grant.key,
+                "upload_id": grant.upload_id,
+                "parts": parts,
+            },
+            headers={"Idempotency-Key": grant.key},
+        )
+
+    def abort(self, filename: str, grant: S3UploadGrant) -> None:
+        """Ask the server to abort a granted upload, errors are only logged."""
+        try:
+            self.__post(
+                "abort",
+                {
+                    "filename": filename,
+                    "bucket": grant.bucket,
+                    "key": grant.key,
+                    "upload_id": grant.upload_id,
+                },
+            )
+        except Exception as e:
+            # the original failure is re-raised by the caller
+            logger.warning(f"Could not abort S3 upload of {filename}: {e}")
+
+    def __post(
+        self,
+        route: str,
+        body: dict[str, Any],
+        headers: Optional[dict[str, str]] = None,
+        idempotent: bool = True,
+    ) -> Any:
+        url = f"{self.client.base_url}/s3/{route}"
+
+        auth_headers = self.client.get_auth_headers(with_json=True)
+        auth_headers = self.client.add_org_header(headers=auth_headers)
+
+        res = self.client.request(
+            "POST",
+            url,
+            idempotent=idempotent,
+            json=body,
+            headers={**auth_headers, **(headers or {})},
+        )
+        response = handlers.handle_response(res)
+
+        if isinstance(response, ApiError):
+            raise ApiResponseError(error=response)
+        if not isinstance(response, dict):
+            raise ApiResponseError(error=handlers.handle_unknown_response(response))
+        return response
+
+
+def _check_cancelled(cancelled: Optional[threading.Event]) -> None:
+    if cancelled is not None and cancelled.is_set():
+        raise UploadCancelledError()
@@ -0,0 +1,99 @@
+"""Helpers for uploads that continue in the background.
+
+A preview upload sends a small sample of the dataset, stratified on the target column,
+and returns as soon as the moai server has accepted it. Schema or target problems
+therefore surface in seconds. The full dataset keeps uploading in the background, and
+the returned `UploadHandle` can be used to wait for or cancel it.
+
+Classes:
+    UploadHandle
+
+Functions:
+    stratified_sample(df, target, n, random_state) -> pd.DataFrame
+"""
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Optional
+
+import numpy as np
+import pandas as pd
+
+from pymoai.exceptions import UploadCancelledError
+
+logger = logging.getLogger(__name__)
+
+
+class UploadHandle:
+    """
+    Handle on a dataset upload running in the background.
+
+    Args:
+        preview (Any): the server response to the preview upload
+        future (:obj: `Future`): the background upload of the full dataset
+        cancelled (:obj: `threading.Event`): set to abort the background upload
+
+    Attributes:
+        preview (Any): the server response to the preview upload
+    """
+
+    def __init__(self, preview: Any, future: Future, cancelled: threading.Event):
+        """Create a new UploadHandle."""
+        self.preview = preview
+        self.__future = future
+        self.__cancelled = cancelled
+
+    def done(self) -> bool:
+        """Whether the full upload finished, failed or was cancelled."""
+        return self.__future.done()
+
+    def result(self, timeout: Optional[float] = None) -> Any:
+        """
+        Wait for the full upload and return the server response.
+
+        Raises:
+            UploadCancelledError: the upload was cancelled
+            concurrent.futures.TimeoutError: the upload did not finish in time
+        """
+        if self.__future.cancelled():
+            raise UploadCancelledError()
+        return self.__future.result(timeout=timeout)
+
+    def cancel(self) -> bool:
+        """Abort the full upload, returns False if it had already finished."""
+        if self.__future.done():
+            return False
+        self.__cancelled.set()
+        self.__future.cancel()
+        return True
+
+
+def stratified_sample(
+    df: pd.DataFrame, target: str, n: int, random_state: int = 0
+) -> pd.DataFrame:
+    """
+    Sample about `n` rows keeping the class balance of `target`.
+
+    Every class keeps at least one row. If `target` is not a column of `df`, a plain
+    random sample is returned.
+
+    Args:
+        df (:ob: `pandas.DataFrame`): A pandas dataframe
+        target (str): Column to stratify on.
+        n (int): Approximate number of rows to return.
+        random_state (int, optional): Seed for reproducible samples.
+
+    Returns:
+        pandas.DataFrame: the sampled rows, in their original order
+    """
+    if n >= len(df):
+        return df
+    if target not in df.columns:
+        return df.sample(n=n, random_state=random_state).sort_index()
+
+    # shuffle once, then keep the first rows of every class up to its quota
+    shuffled = df.sample(frac=1, random_state=random_state)
+    groups = shuffled.groupby(target, dropna=False, observed=True, sort=False)
+    quota = np.maximum(1, np.round(groups[target].transform("size") * n / len(df)))
+    keep = groups.cumcount() < quota
+    return shuffled[keep].sort_index()
@@ -0,0 +1,115 @@
+"""Conditional request cache for metadata polling.
+
+Responses carrying an `ETag` are kept in memory and on local disk. The next request
+for the same url sends `If-None-Match`, and a `304 Not Modified` answer is served from
+the cache, so polling unchanged metadata costs an empty response instead of the full
+payload. The disk copy is shared by every worker on the host using the same
+`Configuration.temp_dir`.
+
+Entries fetched less than `max_age` seconds ago are returned without contacting the
+server at all. The default of 0 always revalidates.
+
+Classes
+    CacheEntry
+    ConditionalCache
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CacheEntry:
+    """Cached response body with its validator."""
+
+    etag: str
+    body: Any
+    fetched_at: float
+
+    dict = asdict
+
+    def fresh(self, max_age: float) -> bool:
+        """Whether the entry can be used without revalidation."""
+        return max_age > 0 and time.time() - self.fetched_at < max_age
+
+
+class ConditionalCache:
+    """
+    In-memory and on-disk cache of ETag validated responses.
+
+    Args:
+        root (str): directory holding cached responses
+        max_age (float, optional): seconds an entry is used without revalidation
+
+    Attributes:
+        root (str): directory holding cached responses
+        max_age (float): seconds an entry is used without revalidation
+    """
+
+    def __init__(self, root: str, max_age: float = 0.0):
+        """Create a new ConditionalCache."""
+        self.root = root
+        self.max_age = max_age
+        self.__memory: dict[str, CacheEntry] = {}
+        self.__lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        """Look up `key` in memory, then on disk."""
+        with self.__lock:
+            entry = self.__memory.get(key)
+
+        disk = self.__read(key)
+        # another worker may have revalidated more recently
+        if disk is not None and (entry is None or disk.fetched_at > entry.fetched_at):
+            entry = disk
+            with self.__lock:
+                self.__memory[key] = entry
+        return entry
+
+    def put(self, key: str, etag: str, body: Any) -> CacheEntry:
+        """Store `body` under `key` with its `etag`."""
+        entry = CacheEntry(etag=etag, body=body, fetched_at=time.time())
+        with self.__lock:
+            self.__memory[key] = entry
+        self.__write(key, entry)
+        return entry
+
+    def touch(self, key: str) -> Optional[CacheEntry]:
+        """Mark `key` as just revalidated, returns the refreshed entry."""
+        entry = self.get(key)
+        if entry is None:
+            return None
+        return self.put(key, entry.etag, entry.body)
+
+    # Internal helpers
+
+    def __path(self, key: str) -> str:
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.root, f"{digest}.json")
+
+    def __read(self, key: str) -> Optional[CacheEntry]:
+        try:
+            with open(self.__path(key), "r", encoding="utf-8") as f:
+                return CacheEntry(**json.load(f))
+        except (OSError, ValueError, TypeError):
+            # missing or partially written entries are treated as a miss
+            return None
+
+    def __write(self, key: str, entry: CacheEntry) -> None:
+        path = self.__path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entry.dict(), f)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError) as e:
+            # the disk copy is an optimisation, memory still holds the entry
+            logger.debug(f"Could not write cache entry {path}: {e}")
@@ -7,8 +7,9 @@ Functions
     handle_unknown_response(msg: Optional[str] = None) -> ApiError
 """
 import logging
+import os
 import time
-from typing import Optional
+from typing import Any, Callable, Optional
 
 import requests
 from dacite import from_dict
@@ -18,9 +19,13 @@ from pymoai.api.commands import Commands
 
 # api classes
 from pymoai.api.datasets import Datasets
+from pymoai.cache import ConditionalCache
 from pymoai.config import Configuration, app_config
 from pymoai.exceptions import ApiResponseError, InvalidTokenError
+from pymoai.retry import CircuitBreaker, RetryPolicy, call_with_retry
 from pymoai.schemas import ApiError, ApiMessage, Credentials, TokenResponse
+from pymoai.spool import Spool
+from pymoai.transport import Transport, make_transport
 
 logger = logging.getLogger(__name__)
 
@@ -38,6 +43,15 @@ class MoaiClient:
         email (str, optional): email used to connect
         password (str, optional): password used to connect
         token (str, optional): the token used to connect
+        retry_policy (:obj: `RetryPolicy`, optional): retry settings for remote
+            calls, built from config if not provided
+        breaker (:obj: `CircuitBreaker`, optional): circuit breaker shared by all
+            calls made through this client, built from config if not provided
+        spool (bool, optional): enable the local spool, so uploads and commands can
+            be queued on disk and delivered in the background
+        transport (:obj: `Transport`, optional): http transport for all calls,
+            built from the `transport` config (`requests`, `urllib3` or `http2`)
+            if not provided
 
     Attributes:
         validated (bool): whether the token stored is valid
@@ -46,6 +60,12 @@ class MoaiClient:
         email (str, optional): email if provided
         password (str, optional): password if provided
         token (str): the token being used to communicate to the remote moai server
+        timeout (tuple[float, float]): default (connect, read) timeouts in seconds
+        retry_policy (:obj: `RetryPolicy`): retry settings in use
+        breaker (:obj: `CircuitBreaker`): circuit breaker in use
+        spool (:obj: `Spool`, optional): the local spool, if enabled
+        transport (:obj: `Transport`): http transport in use
+        cache (:obj: `ConditionalCache`): cache of ETag validated metadata
 
         datasets (:obj: `Datasets`): Datasets related commands
         commands (:obj: `Commands`): Commands and task requests.
@@ -54,12 +74,17 @@ class MoaiClient:
     validated: bool = False
     base_url: str
     org_id: str
+    spool: Optional[Spool] = None
 
     def __init__(
         self,
         email: Optional[str] = None,
         password: Optional[str] = None,
         token: Optional[str] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        spool: bool = False,
+        transport: Optional[Transport] = None,
     ):
         """Create a connection to org's remote moai instance."""
         config = self.config
@@ -69,6 +94,20 @@ class MoaiClient:
         self.email = email or config.email
         self.password = password or config.password
 
+        self.transport = transport or make_transport(
+            config.transport, pool_size=config.pool_size
+        )
+        self.timeout = (config.connect_timeout, config.read_timeout)
+        self.retry_policy = retry_policy or RetryPolicy(
+            max_retries=config.max_retries,
+            backoff_factor=config.backoff_factor,
+            backoff_max=config.backoff_max,
+        )
+        self.breaker = breaker or CircuitBreaker(
+            failure_threshold=config.breaker_threshold,
+            reset_timeout=config.breaker_reset_timeout,
+        )
+
         if self.token is None and self.email is None and self.password is None:
             raise ValueError("Either a token or email/password is required.")
 
@@ -83,9 +122,30 @@ class MoaiClient:
             else:
                 raise e
 
+        self.cache = ConditionalCache(
+            os.path.join(config.temp_dir, "pymoai", "cache", self.org_id),
+            max_age=config.cache_max_age,
+        )
+
+        if spool:
+            self.spool = Spool(
+                os.path.join(config.temp_dir, "pymoai", "spool", self.org_id),
+                batch_size=config.spool_batch_size,
+                concurrency=config.spool_concurrency,
+                retry_policy=self.retry_policy,
+                reauthenticate=(
+                    self.get_token if self.email and self.password else None
+                ),
+            )
+
         self.datasets = Datasets(self)
         self.commands = Commands(self)
 
+        if self.spool is not None:
+            # handlers are registered by the api classes, entries left over from
+            # earlier runs are delivered as well
+            self.spool.start()
+
     @property
     def config(self) -> Configuration:
         """Get runtime application config."""
@@ -97,6 +157,90 @@ class MoaiClient:
         creds = {"email": self.email, "password": self.password}
         return from_dict(data=creds, data_class=Credentials)
 
+    def request(
+        self, method: str, url: str, idempotent: bool = False, **kwargs: Any
+    ) -> requests.Response:
+        """
+        Issue an http request with default timeouts and the circuit breaker.
+
+        Args:
+            method (str): http method
+            url (str): full url to request
+            idempotent (bool, optional): retry all transient failures if True,
+                otherwise only failures to connect. Only set this for calls that are
+                safe to repeat.
+            **kwargs: passed to `Transport.request`
+
+        Returns:
+            requests.Response
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        return self.send(
+            lambda: self.transport.request(method, url, **kwargs),
+            idempotent=idempotent,
+        )
+
+    def send(
+        self,
+        send: Callable[[], requests.Response],
+        idempotent: bool = False,
+        retry: bool = True,
+    ) -> requests.Response:
+        """
+        Run `send` through the circuit breaker and the client retry policy.
+
+        Calls that are not idempotent are only replayed when the connection could not
+        be opened. Use this over `request` when the request body is streamed, and
+        `send` must rebuild the body on every attempt.
+        """
+        policy = self.retry_policy if retry else None
+        return call_with_retry(
+            send, policy=policy, breaker=self.breaker, idempotent=idempotent
+        )
+
+    def close(self) -> None:
+        """Stop the spool drainer, wait for background uploads, release connections."""
+        if self.spool is not None:
+            self.spool.stop()
+        self.datasets.close()
+        self.transport.close()
+
+    def get_cached(self, url: str) -> Any:
+        """
+        GET `url`, revalidating a cached copy with `If-None-Match`.
+
+        Responses with an `ETag` are cached in memory and on disk. A `304` answer is
+        served from the cache.
+
+        Raises:
+            ApiResponseError: the server answered with an error
+        """
+        headers = self.get_auth_headers()
+        headers = self.add_org_header(headers=headers)
+
+        entry = self.cache.get(url)
+        if entry is not None:
+            if entry.fresh(self.cache.max_age):
+                return entry.body
+            headers = {**headers, "If-None-Match": entry.etag}
+
+        res = self.request("GET", url, idempotent=True, headers=headers)
+
+        if res.status_code == 304 and entry is not None:
+            logger.debug(f"Not modified, serving {url} from cache")
+            self.cache.touch(url)
+            return entry.body
+
+        response = handle.handle_response(res)
+        if isinstance(response, ApiError):
+            raise ApiResponseError(error=response)
+
+        etag = res.headers.get("ETag")
+        if etag:
+            self.cache.put(url, etag, response)
+
+        return response
+
     # TODO: Check for exceptions
     def get_token(self) -> TokenResponse:
         """Request new token from api server."""
@@ -111,7 +255,9 @@ class MoaiClient:
             f"Requesting token using url={url}, " "headers={headers}, creds={creds}"
         )
 
-        res = requests.post(url, json=creds.dict(), headers=headers)
+        res = self.request(
+            "POST", url, idempotent=True, json=creds.dict(), headers=headers
+        )
         response = handle.handle_response(res)
 
         logger.debug("Recieved token response: ", response)
@@ -164,7 +310,7 @@ class MoaiClient:
         """Validate token with remote server."""
         headers = self.get_auth_headers(with_json=False)
         url = f"{self.base_url}/validate"
-        req = requests.get(url, headers=headers)
+        req = self.request("GET", url, idempotent=True, headers=headers)
         res = req.json()
 
         if "message" in res:
@@ -203,7 +349,7 @@ class MoaiClient:
 
         logger.debug(f"Api request using headers={headers}")
 
-        res = requests.get(url, headers=headers)
+        res = self.request("GET", url, idempotent=True, headers=headers)
         res = self.parse_response(res)
 
         if "error" in res:
@@ -22,11 +22,31 @@ class Configuration:
     temp_dir: str
     allowed_read_exts: list[str]
     min_stream_size: int
+    s3_part_size: int
+    s3_max_concurrency: int
 
     base_url: str
 
     org_header: str
 
+    # network behaviour
+    transport: str
+    pool_size: int
+    connect_timeout: float
+    read_timeout: float
+    max_retries: int
+    backoff_factor: float
+    backoff_max: float
+    breaker_threshold: int
+    breaker_reset_timeout: float
+
+    # metadata cache
+    cache_max_age: float
+
+    # upload and command spool
+    spool_batch_size: int
+    spool_concurrency: int
+
     dict = asdict
 
 
@@ -38,6 +58,20 @@ configuration_defaults = {
     "password": os.getenv("MOAI_PASSWORD"),
     "allowed_read_exts": [".csv", ".parquet", ".json"],
     "min_stream_size": 1024 * 1024 * 1024,
+    "s3_part_size": 8 * 1024 * 1024,
+    "s3_max_concurrency": 8,
+    "transport": "requests",
+    "pool_size": 16,
+    "connect_timeout": 10.0,
+    "read_timeout": 300.0,
+    "max_retries": 3,
+    "backoff_factor": 0.5,
+    "backoff_max": 30.0,
+    "breaker_threshold": 5,
+    "breaker_reset_timeout": 30.0,
+    "cache_max_age": 0.0,
+    "spool_batch_size": 16,
+    "spool_concurrency": 4,
 }
 
 
@@ -1,6 +1,8 @@
 """Exceptions thrown by classes in pymoai."""
 from typing import Optional
 
+import requests
+
 from pymoai.schemas import ApiError
 
 
@@ -23,3 +25,30 @@ class InvalidTokenError(Exception):
     def __init__(self):
         """Raise invalid token error."""
         super().__init__("You are not authorized to make this request: Invalid token")
+
+
+class ConnectError(requests.exceptions.ConnectionError):
+    """Exception raised when no connection could be opened, so nothing was sent."""
+
+
+class CircuitOpenError(Exception):
+    """Exception raised when calls are short-circuited while the server is down.
+
+    Attributes:
+        retry_in: float - seconds until the next trial call is allowed
+    """
+
+    def __init__(self, retry_in: float = 0.0):
+        """Raise circuit open error."""
+        self.retry_in = retry_in
+        super().__init__(
+            f"Remote moai server unavailable, retrying in {retry_in:.1f} seconds"
+        )
+
+
+class UploadCancelledError(Exception):
+    """Exception raised when a background upload was cancelled."""
+
+    def __init__(self):
+        """Raise upload cancelled error."""
+        super().__init__("Upload was cancelled")
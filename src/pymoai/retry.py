@@ -0,0 +1,207 @@
+"""Retry policy and circuit breaker for remote api calls.
+
+Calls to the moai server are retried with exponential backoff and full jitter when
+they fail with a transient error (connection reset, timeout, 429/5xx). A shared
+circuit breaker stops issuing requests while the server is down, so callers fail fast
+instead of stacking up threads that wait on timeouts.
+
+Idempotent calls are retried on any transient error. Other calls, such as uploads
+without an idempotency key, may have reached the server when the response is lost, so
+they are only replayed when the connection could not be opened. Callers opt in by
+passing a `send` callable that issues a fresh request.
+
+Classes
+    RetryPolicy
+    CircuitBreaker
+
+Functions
+    call_with_retry(send, policy, breaker, idempotent) -> requests.Response
+"""
+import logging
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+import requests
+
+from pymoai.exceptions import CircuitOpenError, ConnectError
+
+logger = logging.getLogger(__name__)
+
+RETRY_EXCEPTIONS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+# raised before any of the request was sent, safe to replay for every call
+UNSENT_EXCEPTIONS = (ConnectError, requests.exceptions.ConnectTimeout)
+
+
+@dataclass
+class RetryPolicy:
+    """Configurable retry behaviour for idempotent api calls.
+
+    Attributes:
+        max_retries (int): retries after the first attempt, 0 disables retrying
+        backoff_factor (float): base delay in seconds, doubled on every attempt
+        backoff_max (float): upper bound for a single delay in seconds
+        status_forcelist (tuple[int, ...]): response codes considered transient
+        respect_retry_after (bool): honour the `Retry-After` header if present
+    """
+
+    max_retries: int = 3
+    backoff_factor: float = 0.5
+    backoff_max: float = 30.0
+    status_forcelist: tuple[int, ...] = (429, 502, 503, 504)
+    respect_retry_after: bool = True
+
+    def backoff(self, attempt: int) -> float:
+        """Delay before retry number `attempt` (0 based), using full jitter."""
+        ceiling = min(self.backoff_max, self.backoff_factor * (2**attempt))
+        return random.uniform(0, ceiling)
+
+    def retry_after(self, res: requests.Response) -> Optional[float]:
+        """Parse the `Retry-After` header (seconds form only)."""
+        if not self.respect_retry_after:
+            return None
+        value = res.headers.get("Retry-After")
+        try:
+            return min(self.backoff_max, float(value)) if value else None
+        except ValueError:
+            return None
+
+
+@dataclass
+class CircuitBreaker:
+    """Fail fast while the remote server is unavailable.
+
+    The breaker opens after `failure_threshold` consecutive transient failures. While
+    open, calls raise `CircuitOpenError` without touching the network. After
+    `reset_timeout` seconds a single trial call is let through (half open), and its
+    outcome closes or re-opens the breaker.
+
+    Attributes:
+        failure_threshold (int): consecutive failures before opening
+        reset_timeout (float): seconds to stay open before a trial call
+    """
+
+    failure_threshold: int = 5
+    reset_timeout: float = 30.0
+
+    failures: int = field(default=0, init=False)
+    opened_at: Optional[float] = field(default=None, init=False)
+    _trial_at: Optional[float] = field(default=None, init=False, repr=False)
+    _lock: threading.Lock = field(
+        default_factory=threading.Lock, init=False, repr=False
+    )
+
+    @property
+    def state(self) -> str:
+        """Current state, one of `closed`, `open` or `half-open`."""
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def before_call(self) -> None:
+        """Raise `CircuitOpenError` if no call should be made right now."""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return
+            if state == "half-open" and not self.__trial_in_flight():
+                self._trial_at = time.monotonic()
+                return
+            raise CircuitOpenError(
+                retry_in=max(0.0, self.reset_timeout - self.__open_for())
+            )
+
+    def record_success(self) -> None:
+        """Close the breaker after a successful call."""
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_at = None
+
+    def record_failure(self) -> None:
+        """Count a transient failure, opening the breaker at the threshold."""
+        with self._lock:
+            self.failures += 1
+            if self._trial_at is not None or self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    logger.warning("Circuit breaker opened after repeated failures")
+                self.opened_at = time.monotonic()
+            self._trial_at = None
+
+    def __trial_in_flight(self) -> bool:
+        # a trial that never reported back must not keep the breaker open forever
+        if self._trial_at is None:
+            return False
+        return time.monotonic() - self._trial_at < self.reset_timeout
+
+    def __open_for(self) -> float:
+        return time.monotonic() - self.opened_at if self.opened_at else 0.0
+
+
+def call_with_retry(
+    send: Callable[[], requests.Response],
+    policy: Optional[RetryPolicy] = None,
+    breaker: Optional[CircuitBreaker] = None,
+    idempotent: bool = True,
+) -> requests.Response:
+    """
+    Issue a request through `send`, retrying transient failures.
+
+    Calls that are not idempotent are only retried when the connection could not be
+    opened, never after a read timeout or a retryable status, as the server may
+    already have acted on them.
+
+    Args:
+        send (Callable[[], requests.Response]): issues one complete request. It is
+            called once per attempt, so it must rebuild any streamed request body.
+        policy (:obj: `RetryPolicy`, optional): retry settings, no retries if None
+        breaker (:obj: `CircuitBreaker`, optional): shared breaker to consult
+        idempotent (bool, optional): whether the call can be replayed after it
+            reached the server. Defaults to True.
+
+    Returns:
+        requests.Response: the last response received
+
+    Raises:
+        CircuitOpenError: the breaker is open and the call was not attempted
+        requests.exceptions.RequestException: the last transient error, once retries
+            are exhausted
+    """
+    policy = policy or RetryPolicy(max_retries=0)
+    attempt = 0
+
+    while True:
+        if breaker is not None:
+            breaker.before_call()
+
+        delay: Optional[float] = None
+        try:
+            res = send()
+        except RETRY_EXCEPTIONS as e:
+            if breaker is not None:
+                breaker.record_failure()
+            if attempt >= policy.max_retries or not (
+                idempotent or isinstance(e, UNSENT_EXCEPTIONS)
+            ):
+                raise
+            logger.debug(f"Transient error on attempt {attempt + 1}: {e}")
+        else:
+            if breaker is not None:
+                # any server error counts, retryable or not
+                if res.status_code >= 500:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+            if res.status_code not in policy.status_forcelist:
+                return res
+            if attempt >= policy.max_retries or not idempotent:
+                return res
+            logger.debug(f"Retryable status {res.status_code} on attempt {attempt + 1}")
+            delay = policy.retry_after(res)
+
+        time.sleep(delay if delay is not None else policy.backoff(attempt))
+        attempt += 1
@@ -1,5 +1,6 @@
 """Schemas for api responses and requests."""
 from dataclasses import asdict, dataclass
+from typing import Optional
 
 
 @dataclass
@@ -52,6 +53,31 @@ class HealthStatus:
     dict = asdict
 
 
+@dataclass
+class DatasetVersion:
+    """Schema for a single version of a remote dataset."""
+
+    version: int
+    path: str
+    created: str
+    target: Optional[str] = None
+    rows: Optional[int] = None
+    size: Optional[int] = None
+
+    dict = asdict
+
+
+@dataclass
+class DatasetInfo:
+    """Schema for a remote dataset and its latest version."""
+
+    name: str
+    versions: int
+    latest: Optional[DatasetVersion] = None
+
+    dict = asdict
+
+
 @dataclass
 class CommandArgs:
     """Schema for issuing moai commands."""
@@ -59,3 +85,45 @@ class CommandArgs:
     args: list[str]
 
     dict = asdict
+
+
+@dataclass
+class DatasetSchema:
+    """Schema sent with dataset uploads."""
+
+    columns: dict[str, str]
+    rows: int
+    size: Optional[int]
+
+    dict = asdict
+
+
+@dataclass
+class S3Credentials:
+    """Temporary credentials scoped to a single upload."""
+
+    AccessKeyId: str
+    SecretAccessKey: str
+    SessionToken: Optional[str] = None
+
+    dict = asdict
+
+
+@dataclass
+class S3UploadGrant:
+    """Grant to upload a dataset directly to the moai S3 bucket.
+
+    The server either returns scoped `credentials`, or a multipart `upload_id` with
+    presigned `part_urls` of `part_size` bytes each.
+    """
+
+    bucket: str
+    key: str
+    region: Optional[str] = None
+    endpoint_url: Optional[str] = None
+    credentials: Optional[S3Credentials] = None
+    upload_id: Optional[str] = None
+    part_size: Optional[int] = None
+    part_urls: Optional[list[str]] = None
+
+    dict = asdict
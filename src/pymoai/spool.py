@@ -0,0 +1,363 @@
+"""Durable local spool for uploads and commands.
+
+When the moai server is slow or briefly unreachable, producers should not block on it.
+With spooling enabled, `Datasets.add` and `Commands.run` write the outgoing request to a
+write-ahead spool on local disk and return immediately. A background drainer delivers
+spooled entries in batches with bounded concurrency.
+
+Delivery is at-least-once: an entry is only removed from disk once the server accepted
+it. A drainer renews the lease on its claimed entries while delivering them, and
+entries claimed by a process that died are picked up again once the lease times out.
+Every entry carries an idempotency key, sent as the `Idempotency-Key` header, so the
+server can drop duplicates. Entries rejected with a non-retryable client error, or that
+a handler cannot deliver at all, are moved to a `failed` directory for inspection.
+Entries rejected as unauthorized stay pending, as they succeed once the token is
+renewed.
+
+Layout of the spool directory:
+
+    pending/<seq>-<id>.json   entries waiting for delivery
+    inflight/<seq>-<id>.json  entries claimed by a drainer
+    failed/<seq>-<id>.json    entries the server rejected
+    data/<id>                 request bodies of spooled uploads
+
+Classes:
+    Spool
+"""
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterator, Optional
+
+import requests
+
+from pymoai.exceptions import CircuitOpenError
+from pymoai.retry import RetryPolicy
+
+logger = logging.getLogger(__name__)
+
+SpoolHandler = Callable[[dict[str, Any], str], requests.Response]
+SpoolDiscard = Callable[[dict[str, Any], str], None]
+
+
+class Spool:
+    """
+    Write-ahead spool with a background drainer.
+
+    Handlers deliver entries of a given kind. They receive the entry payload and its
+    idempotency key, and return the server response.
+
+    Args:
+        root (str): directory holding the spool
+        batch_size (int, optional): entries claimed per drain cycle
+        concurrency (int, optional): entries delivered in parallel
+        poll_interval (float, optional): seconds between scans of an idle spool
+        lease_timeout (float, optional): seconds before an unfinished claim is
+            considered abandoned and the entry is delivered again
+        retry_policy (:obj: `RetryPolicy`, optional): backoff between failing
+            drain cycles
+        reauthenticate (Callable, optional): called when the server answers a
+            delivery with `401 Unauthorized`, to renew the token before the entry is
+            delivered again
+
+    Attributes:
+        root (str): directory holding the spool
+    """
+
+    def __init__(
+        self,
+        root: str,
+        batch_size: int = 16,
+        concurrency: int = 4,
+        poll_interval: float = 1.0,
+        lease_timeout: float = 600.0,
+        retry_policy: Optional[RetryPolicy] = None,
+        reauthenticate: Optional[Callable[[], Any]] = None,
+    ):
+        """Create a new Spool."""
+        self.root = root
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.lease_timeout = lease_timeout
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.reauthenticate = reauthenticate
+
+        self.__handlers: dict[str, SpoolHandler] = {}
+        self.__discards: dict[str, SpoolDiscard] = {}
+        self.__executor = ThreadPoolExecutor(
+            max_workers=concurrency, thread_name_prefix="pymoai-spool"
+        )
+        self.__wake = threading.Event()
+        self.__stopped = threading.Event()
+        self.__thread: Optional[threading.Thread] = None
+
+        for name in ("pending", "inflight", "failed", "data"):
+            os.makedirs(self.__dir(name), exist_ok=True)
+
+    # Producers
+
+    def register(
+        self,
+        kind: str,
+        handler: SpoolHandler,
+        discard: Optional[SpoolDiscard] = None,
+    ) -> None:
+        """
+        Register the handler delivering entries of `kind`.
+
+        Args:
+            kind (str): the kind of entries delivered
+            handler (Callable): delivers an entry, given its payload and key
+            discard (Callable, optional): releases state kept for an entry, given its
+                payload and key, once it is moved to `failed`
+        """
+        self.__handlers[kind] = handler
+        if discard is not None:
+            self.__discards[kind] = discard
+
+    def put(
+        self, kind: str, payload: dict[str, Any], body: Optional[bytes] = None
+    ) -> str:
+        """
+        Persist an entry for delivery and return its idempotency key.
+
+        The body is written and synced first, so an entry visible in `pending` is
+        always complete.
+
+        Args:
+            kind (str): the handler to deliver the entry with
+            payload (dict[str, Any]): json serializable request description
+            body (bytes, optional): request body, for uploads
+
+        Returns:
+            str: the idempotency key of the entry
+        """
+        key = uuid.uuid4().hex
+        if body is not None:
+            self.__write(os.path.join(self.__dir("data"), key), body)
+            payload = {**payload, "body": key}
+
+        entry = {"id": key, "kind": kind, "attempts": 0, "payload": payload}
+        name = f"{time.time_ns():020d}-{key}.json"
+        self.__write(
+            os.path.join(self.__dir("pending"), name), json.dumps(entry).encode("utf-8")
+        )
+
+        self.__wake.set()
+        return key
+
+    def body_path(self, payload: dict[str, Any]) -> Optional[str]:
+        """Location of the request body stored for `payload`, if any."""
+        key = payload.get("body")
+        return os.path.join(self.__dir("data"), key) if key else None
+
+    def pending(self) -> int:
+        """Number of entries not delivered yet."""
+        return sum(
+            name.endswith(".json")
+            for folder in ("pending", "inflight")
+            for name in os.listdir(self.__dir(folder))
+        )
+
+    # Drainer
+
+    def start(self) -> None:
+        """Start draining in a background thread."""
+        if self.__thread is not None and self.__thread.is_alive():
+            return
+        self.__stopped.clear()
+        self.__thread = threading.Thread(
+            target=self.__drain_loop, name="pymoai-spool-drainer", daemon=True
+        )
+        self.__thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop the drainer. Undelivered entries stay on disk for the next start."""
+        self.__stopped.set()
+        self.__wake.set()
+        if self.__thread is not None:
+            self.__thread.join(timeout)
+            self.__thread = None
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every entry is delivered, returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        self.__wake.set()
+        while self.pending() > 0:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(min(self.poll_interval, 0.1))
+        return True
+
+    def drain(self) -> int:
+        """Deliver one batch of entries, returns the number delivered."""
+        self.__recover()
+        claimed = self.__claim()
+        if not claimed:
+            return 0
+        return sum(self.__executor.map(self.__deliver, claimed))
+
+    # Internal helpers
+
+    def __dir(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    def __write(self, path: str, data: bytes) -> None:
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def __drain_loop(self) -> None:
+        failures = 0
+        while not self.__stopped.is_set():
+            self.__wake.clear()
+            try:
+                claimed = self.__claim()
+                if not claimed:
+                    self.__recover()
+                    self.__wake.wait(self.poll_interval)
+                    continue
+                delivered = sum(self.__executor.map(self.__deliver, claimed))
+            except Exception as e:
+                logger.error(f"Spool drainer error: {e}")
+                delivered = 0
+
+            if delivered == 0:
+                # the server is struggling, back off before the next batch
+                self.__stopped.wait(self.retry_policy.backoff(failures))
+                failures += 1
+            else:
+                failures = 0
+
+    def __claim(self) -> list[str]:
+        claimed = []
+        for name in sorted(os.listdir(self.__dir("pending"))):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.__dir("inflight"), name)
+            try:
+                # rename is atomic, so only one drainer wins an entry
+                os.rename(os.path.join(self.__dir("pending"), name), path)
+            except FileNotFoundError:
+                continue
+            os.utime(path)
+            claimed.append(path)
+            if len(claimed) >= self.batch_size:
+                break
+        return claimed
+
+    def __recover(self) -> None:
+        now = time.time()
+        for name in os.listdir(self.__dir("inflight")):
+            path = os.path.join(self.__dir("inflight"), name)
+            try:
+                if now - os.path.getmtime(path) > self.lease_timeout:
+                    logger.warning(f"Recovering abandoned spool entry {name}")
+                    os.rename(path, os.path.join(self.__dir("pending"), name))
+            except FileNotFoundError:
+                continue
+
+    def __deliver(self, path: str) -> bool:
+        # entries are independent, one failing must not stop the rest of the batch
+        try:
+            return self.__deliver_entry(path)
+        except Exception as e:
+            logger.error(f"Spool delivery of {os.path.basename(path)} failed: {e}")
+            return False
+
+    def __deliver_entry(self, path: str) -> bool:
+        with open(path, "rb") as f:
+            entry = json.load(f)
+
+        handler = self.__handlers.get(entry["kind"])
+        if handler is None:
+            logger.error(f"No spool handler for {entry['kind']}, entry {entry['id']}")
+            self.__release(path, entry)
+            return False
+
+        try:
+            with self.__lease(path):
+                res = handler(entry["payload"], entry["id"])
+        except (CircuitOpenError, requests.exceptions.RequestException) as e:
+            logger.debug(f"Spool delivery of {entry['id']} failed: {e}")
+            self.__release(path, entry)
+            return False
+        except Exception as e:
+            logger.error(f"Spool entry {entry['id']} failed ({e}), moved to failed")
+            self.__fail(path, entry)
+            return False
+
+        if res.ok:
+            self.__complete(path, entry)
+            return True
+
+        if res.status_code == 401 and self.reauthenticate is not None:
+            logger.warning(f"Spool entry {entry['id']} unauthorized, renewing token")
+            try:
+                self.reauthenticate()
+            except Exception as e:
+                logger.error(f"Could not renew token: {e}")
+        elif 400 <= res.status_code < 500 and res.status_code not in (401, 408, 429):
+            logger.error(
+                f"Spool entry {entry['id']} rejected (Code: {res.status_code}), "
+                "moved to failed"
+            )
+            self.__fail(path, entry)
+            return False
+
+        self.__release(path, entry)
+        return False
+
+    @contextlib.contextmanager
+    def __lease(self, path: str) -> Iterator[None]:
+        # renew the claim while the handler runs, so slow deliveries are not
+        # recovered and delivered a second time
+        done = threading.Event()
+
+        def renew() -> None:
+            while not done.wait(self.lease_timeout / 3):
+                try:
+                    os.utime(path)
+                except FileNotFoundError:
+                    return
+
+        renewer = threading.Thread(target=renew, name="pymoai-spool-lease", daemon=True)
+        renewer.start()
+        try:
+            yield
+        finally:
+            done.set()
+            renewer.join()
+
+    def __complete(self, path: str, entry: dict[str, Any]) -> None:
+        body = self.body_path(entry["payload"])
+        for done in (body, path):
+            if done is not None:
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(done)
+
+    def __fail(self, path: str, entry: dict[str, Any]) -> None:
+        os.replace(path, os.path.join(self.__dir("failed"), os.path.basename(path)))
+
+        discard = self.__discards.get(entry["kind"])
+        if discard is not None:
+            try:
+                discard(entry["payload"], entry["id"])
+            except Exception as e:
+                logger.error(
+                    f"Could not discard state of spool entry {entry['id']}: {e}"
+                )
+
+    def __release(self, path: str, entry: dict[str, Any]) -> None:
+        entry = {**entry, "attempts": entry["attempts"] + 1}
+        pending = os.path.join(self.__dir("pending"), os.path.basename(path))
+        self.__write(path, json.dumps(entry).encode("utf-8"))
+        os.replace(path, pending)
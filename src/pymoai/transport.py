@@ -0,0 +1,314 @@
+"""Pluggable http transports used by MoaiClient.
+
+Every api call goes through a `Transport`, so the http stack can be swapped without
+touching the api classes. All transports return `requests.Response` objects and raise
+`requests` exceptions, so response handling and retries behave the same on each. A
+connection that could not be opened at all raises `ConnectError`, which tells
+retries that the request never reached the server.
+
+Available transports:
+
+    requests  pooled `requests.Session`, the default
+    urllib3   raw `urllib3.PoolManager`, least per-call overhead, for command heavy
+              workloads
+    http2     `httpx` client with HTTP/2, multiplexing concurrent calls over one
+              connection. Requires the `http2` extra: `pip install pymoai[http2]`
+
+Classes
+    Transport
+    RequestsTransport
+    Urllib3Transport
+    Http2Transport
+
+Functions
+    make_transport(name: str, pool_size: int) -> Transport
+"""
+import abc
+import json as jsonlib
+import logging
+from typing import Any, Iterator, Optional, Union
+
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+from pymoai.exceptions import ConnectError
+
+logger = logging.getLogger(__name__)
+
+Timeout = Optional[Union[float, tuple[float, float]]]
+
+CHUNK_SIZE = 64 * 1024
+
+
+class Transport(abc.ABC):
+    """Base class for http transports."""
+
+    name: str = "base"
+
+    def __init__(self, pool_size: int = 16):
+        """Create a new Transport keeping up to `pool_size` connections per host."""
+        self.pool_size = pool_size
+
+    @abc.abstractmethod
+    def request(
+        self,
+        method: str,
+        url: str,
+        headers: Optional[dict[str, str]] = None,
+        json: Optional[Any] = None,
+        data: Optional[Any] = None,
+        timeout: Timeout = None,
+    ) -> requests.Response:
+        """
+        Issue a single http request.
+
+        Args:
+            method (str): http method
+            url (str): full url to request
+            headers (dict[str, str], optional): request headers
+            json (Any, optional): body serialized as json
+            data (Any, optional): raw body, bytes or a file-like object
+            timeout (float | tuple[float, float], optional): total or
+                (connect, read) timeouts in seconds
+
+        Returns:
+            requests.Response
+
+        Raises:
+            ConnectError: no connection could be opened, nothing was sent
+            requests.exceptions.ConnectionError: the connection failed
+            requests.exceptions.Timeout: the connection or read timed out
+        """
+
+    def close(self) -> None:
+        """Release pooled connections."""
+
+    # Internal helpers
+
+    def _encode(
+        self, headers: Optional[dict[str, str]], json: Optional[Any], data: Any
+    ) -> tuple[dict[str, str], Any]:
+        headers = dict(headers or {})
+        if json is not None:
+            headers.setdefault("Content-Type", "application/json")
+            return headers, jsonlib.dumps(json).encode("utf-8")
+        # streamed bodies (multipart encoders) know their length up front
+        length = getattr(data, "len", None)
+        if length is not None and not any(
+            k.lower() == "content-length" for k in headers
+        ):
+            headers["Content-Length"] = str(length)
+        return headers, data
+
+    def _response(
+        self,
+        url: str,
+        status: int,
+        reason: Optional[str],
+        headers: Any,
+        content: bytes,
+    ) -> requests.Response:
+        res = requests.Response()
+        res.url = url
+        res.status_code = status
+        res.reason = reason or ""
+        res.headers = CaseInsensitiveDict(headers)
+        res._content = content
+        res.encoding = requests.utils.get_encoding_from_headers(res.headers)
+        return res
+
+
+class RequestsTransport(Transport):
+    """Transport backed by a pooled `requests.Session`."""
+
+    name = "requests"
+
+    def __init__(self, pool_size: int = 16):
+        """Create a new RequestsTransport."""
+        super().__init__(pool_size)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        headers: Optional[dict[str, str]] = None,
+        json: Optional[Any] = None,
+        data: Optional[Any] = None,
+        timeout: Timeout = None,
+    ) -> requests.Response:
+        """Issue a single http request using requests."""
+        try:
+            return self.session.request(
+                method, url, headers=headers, json=json, data=data, timeout=timeout
+            )
+        except requests.exceptions.ConnectTimeout:
+            raise
+        except requests.exceptions.ConnectionError as e:
+            reason = getattr(e.args[0], "reason", None) if e.args else None
+            if isinstance(reason, urllib3.exceptions.NewConnectionError):
+                raise ConnectError(*e.args, request=e.request, response=e.response)
+            raise
+
+    def close(self) -> None:
+        """Release pooled connections."""
+        self.session.close()
+
+
+class Urllib3Transport(Transport):
+    """Transport calling `urllib3` directly, skipping the requests machinery."""
+
+    name = "urllib3"
+
+    def __init__(self, pool_size: int = 16):
+        """Create a new Urllib3Transport."""
+        super().__init__(pool_size)
+        self.pool = urllib3.PoolManager(num_pools=pool_size, maxsize=pool_size)
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        headers: Optional[dict[str, str]] = None,
+        json: Optional[Any] = None,
+        data: Optional[Any] = None,
+        timeout: Timeout = None,
+    ) -> requests.Response:
+        """Issue a single http request using urllib3."""
+        headers, body = self._encode(headers, json, data)
+
+        if isinstance(timeout, tuple):
+            connect, read = timeout
+            urllib3_timeout = urllib3.Timeout(connect=connect, read=read)
+        else:
+            urllib3_timeout = urllib3.Timeout(total=timeout)
+
+        try:
+            res = self.pool.request(
+                method,
+                url,
+                body=body,
+                headers=headers,
+                timeout=urllib3_timeout,
+                retries=False,
+                preload_content=True,
+            )
+        except urllib3.exceptions.NewConnectionError as e:
+            # checked first, older urllib3 derives it from ConnectTimeoutError
+            raise ConnectError(e)
+        except urllib3.exceptions.ConnectTimeoutError as e:
+            raise requests.exceptions.ConnectTimeout(e)
+        except (
+            urllib3.exceptions.ReadTimeoutError,
+            urllib3.exceptions.TimeoutError,
+        ) as e:
+            raise requests.exceptions.ReadTimeout(e)
+        except urllib3.exceptions.HTTPError as e:
+            raise requests.exceptions.ConnectionError(e)
+
+        return self._response(url, res.status, res.reason, res.headers, res.data)
+
+    def close(self) -> None:
+        """Release pooled connections."""
+        self.pool.clear()
+
+
+class Http2Transport(Transport):
+    """Transport using `httpx` with HTTP/2, multiplexing calls on one connection."""
+
+    name = "http2"
+
+    def __init__(self, pool_size: int = 16):
+        """Create a new Http2Transport."""
+        super().__init__(pool_size)
+        try:
+            import httpx
+        except ImportError:
+            raise ImportError(
+                "The http2 transport requires httpx, install pymoai[http2]."
+            )
+
+        self.httpx = httpx
+        self.client = httpx.Client(
+            http2=True,
+            limits=httpx.Limits(
+                max_connections=pool_size, max_keepalive_connections=pool_size
+            ),
+        )
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        headers: Optional[dict[str, str]] = None,
+        json: Optional[Any] = None,
+        data: Optional[Any] = None,
+        timeout: Timeout = None,
+    ) -> requests.Response:
+        """Issue a single http request using httpx."""
+        httpx = self.httpx
+        headers, body = self._encode(headers, json, data)
+        if hasattr(body, "read"):
+            body = _iter_chunks(body)
+
+        if isinstance(timeout, tuple):
+            connect, read = timeout
+            httpx_timeout = httpx.Timeout(
+                connect=connect, read=read, write=read, pool=connect
+            )
+        else:
+            httpx_timeout = httpx.Timeout(timeout)
+
+        try:
+            res = self.client.request(
+                method, url, headers=headers, content=body, timeout=httpx_timeout
+            )
+        except httpx.ConnectTimeout as e:
+            raise requests.exceptions.ConnectTimeout(e)
+        except httpx.ConnectError as e:
+            raise ConnectError(e)
+        except httpx.TimeoutException as e:
+            raise requests.exceptions.ReadTimeout(e)
+        except httpx.TransportError as e:
+            raise requests.exceptions.ConnectionError(e)
+
+        return self._response(
+            url,
+            res.status_code,
+            res.reason_phrase,
+            res.headers.multi_items(),
+            res.content,
+        )
+
+    def close(self) -> None:
+        """Release pooled connections."""
+        self.client.close()
+
+
+def _iter_chunks(body: Any) -> Iterator[bytes]:
+    while True:
+        chunk = body.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        yield chunk
+
+
+transports: dict[str, type[Transport]] = {
+    RequestsTransport.name: RequestsTransport,
+    Urllib3Transport.name: Urllib3Transport,
+    Http2Transport.name: Http2Transport,
+}
+
+
+def make_transport(name: str = "requests", pool_size: int = 16) -> Transport:
+    """Create a transport by name, one of `requests`, `urllib3` or `http2`."""
+    if name not in transports:
+        raise ValueError(
+            f"Unknown transport {name}, expected one of {', '.join(transports)}"
+        )
+    return transports[name](pool_size=pool_size)
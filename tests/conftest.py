@@ -0,0 +1,311 @@
+"""Shared fixtures for pymoai test suites."""
+import datetime
+import http.server
+import ipaddress
+import json
+import socket
+import ssl
+import threading
+from pathlib import Path
+from typing import Callable, Optional
+
+import pytest
+
+
+class StandInServer:
+    """Local http server standing in for a remote moai server.
+
+    Routes map `METHOD /path` to a function taking the request handler, the request
+    body and returning (status, headers, json body). Unrouted paths echo the request.
+    """
+
+    def __init__(self):
+        """Start the server on a free local port."""
+        self.routes: dict[str, Callable] = {}
+        self.requests: list[dict] = []
+
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def handle_any(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length)
+                path = self.path.split("?")[0]
+                server.requests.append(
+                    {"method": self.command, "path": path, "headers": self.headers}
+                )
+
+                route = server.routes.get(f"{self.command} {path}")
+                if route is not None:
+                    status, headers, payload = route(self, body)
+                else:
+                    status, headers = 200, {}
+                    payload = {"path": path, "size": len(body)}
+
+                data = b"" if payload is None else json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for k, v in headers.items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST = do_PUT = handle_any
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def url(self) -> str:
+        """Base url of the server."""
+        return f"http://127.0.0.1:{self.httpd.server_port}"
+
+    def route(self, key: str, handler: Optional[Callable] = None, /, **payload):
+        """Register a route, or a fixed json response given as kwargs."""
+        self.routes[key] = handler or (lambda req, body: (200, {}, payload))
+
+    @staticmethod
+    def multipart_fields(req, body: bytes) -> dict[str, bytes]:
+        """Fields of a multipart request body, such as an upload, by name."""
+        from requests_toolbelt.multipart.decoder import MultipartDecoder
+
+        fields = {}
+        for part in MultipartDecoder(body, req.headers["Content-Type"]).parts:
+            disposition = part.headers[b"Content-Disposition"].decode()
+            name = disposition.split('name="')[1].split('"')[0]
+            fields[name] = part.content
+        return fields
+
+    def close(self):
+        """Stop the server."""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class H2StandInServer(StandInServer):
+    """Local https server speaking only HTTP/2, standing in for a remote moai server.
+
+    h2 is negotiated through ALPN with a self-signed certificate in `cert_file`, so
+    clients must trust it. Routes work as on `StandInServer`. Every stream is answered
+    on its own thread, so concurrent requests are multiplexed over one connection, and
+    `requests` also records the connection and stream id of each request.
+    """
+
+    def __init__(self, cert_dir: Path):
+        """Start the server on a free local port."""
+        self.routes: dict[str, Callable] = {}
+        self.requests: list[dict] = []
+        self.cert_file, key_file = _self_signed_cert(cert_dir)
+
+        self.context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        self.context.load_cert_chain(self.cert_file, key_file)
+        self.context.set_alpn_protocols(["h2"])
+
+        self.sock = socket.create_server(("127.0.0.1", 0))
+        self.connections: list[socket.socket] = []
+        self.thread = threading.Thread(target=self.__accept, daemon=True)
+        self.thread.start()
+
+    @property
+    def url(self) -> str:
+        """Base url of the server."""
+        return f"https://127.0.0.1:{self.sock.getsockname()[1]}"
+
+    def close(self):
+        """Stop the server."""
+        self.sock.close()
+        for sock in self.connections:
+            sock.close()
+
+    # Internal helpers
+
+    def __accept(self):
+        while True:
+            try:
+                sock, _ = self.sock.accept()
+            except OSError:
+                return
+            self.connections.append(sock)
+            threading.Thread(
+                target=self.__serve, args=(sock, len(self.connections)), daemon=True
+            ).start()
+
+    def __serve(self, sock: socket.socket, connection_id: int):
+        import h2.config
+        import h2.connection
+        import h2.events
+
+        try:
+            sock = self.context.wrap_socket(sock, server_side=True)
+        except (OSError, ssl.SSLError):
+            return
+        conn = h2.connection.H2Connection(
+            h2.config.H2Configuration(client_side=False, header_encoding="utf-8")
+        )
+        lock = threading.Lock()
+        streams: dict[int, tuple[dict, bytearray]] = {}
+        with lock:
+            conn.initiate_connection()
+            sock.sendall(conn.data_to_send())
+
+        while True:
+            try:
+                data = sock.recv(65536)
+            except OSError:
+                return
+            if not data:
+                return
+            with lock:
+                for event in conn.receive_data(data):
+                    if isinstance(event, h2.events.RequestReceived):
+                        streams[event.stream_id] = (dict(event.headers), bytearray())
+                    elif isinstance(event, h2.events.DataReceived):
+                        streams[event.stream_id][1].extend(event.data)
+                        conn.acknowledge_received_data(
+                            event.flow_controlled_length, event.stream_id
+                        )
+                    elif isinstance(event, h2.events.StreamEnded):
+                        headers, body = streams.pop(event.stream_id)
+                        threading.Thread(
+                            target=self.__respond,
+                            args=(sock, conn, lock, connection_id, event.stream_id),
+                            kwargs={"headers": headers, "body": bytes(body)},
+                            daemon=True,
+                        ).start()
+                    elif isinstance(event, h2.events.StreamReset):
+                        streams.pop(event.stream_id, None)
+                try:
+                    sock.sendall(conn.data_to_send())
+                except OSError:
+                    return
+
+    def __respond(self, sock, conn, lock, connection_id, stream_id, headers, body):
+        import h2.exceptions
+        from requests.structures import CaseInsensitiveDict
+
+        method, path = headers[":method"], headers[":path"].split("?")[0]
+        headers = CaseInsensitiveDict(headers)
+        self.requests.append(
+            {
+                "method": method,
+                "path": path,
+                "headers": headers,
+                "connection": connection_id,
+                "stream": stream_id,
+            }
+        )
+
+        route = self.routes.get(f"{method} {path}")
+        if route is not None:
+            status, extra, payload = route(_H2Request(headers), body)
+        else:
+            status, extra = 200, {}
+            payload = {"path": path, "size": len(body)}
+
+        data = b"" if payload is None else json.dumps(payload).encode()
+        response = [
+            (":status", str(status)),
+            ("content-type", "application/json"),
+            ("content-length", str(len(data))),
+        ] + [(k.lower(), v) for k, v in extra.items()]
+        with lock:
+            try:
+                conn.send_headers(stream_id, response)
+                size = conn.max_outbound_frame_size
+                for i in range(0, len(data), size):
+                    conn.send_data(stream_id, data[i : i + size])
+                conn.end_stream(stream_id)
+                sock.sendall(conn.data_to_send())
+            except (h2.exceptions.ProtocolError, OSError):
+                # the client gave up on the stream, e.g. after a read timeout
+                pass
+
+
+class _H2Request:
+    """Request passed to routes of the h2 stand-in, exposing its headers."""
+
+    def __init__(self, headers):
+        self.headers = headers
+
+
+def _self_signed_cert(cert_dir: Path) -> tuple[str, str]:
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "127.0.0.1")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(minutes=5))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .add_extension(
+            x509.SubjectAlternativeName(
+                [x509.IPAddress(ipaddress.ip_address("127.0.0.1"))]
+            ),
+            critical=False,
+        )
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+        .sign(key, hashes.SHA256())
+    )
+
+    cert_file, key_file = cert_dir / "cert.pem", cert_dir / "key.pem"
+    cert_file.write_bytes(cert.public_bytes(serialization.Encoding.PEM))
+    key_file.write_bytes(
+        key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        )
+    )
+    return str(cert_file), str(key_file)
+
+
+@pytest.fixture
+def stand_in():
+    """Local stand-in for a remote moai server."""
+    server = StandInServer()
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def h2_stand_in(tmp_path_factory, monkeypatch):
+    """HTTP/2 stand-in for a remote moai server, its certificate trusted by httpx."""
+    pytest.importorskip("h2")
+    pytest.importorskip("cryptography")
+    server = H2StandInServer(tmp_path_factory.mktemp("h2"))
+    monkeypatch.setenv("SSL_CERT_FILE", server.cert_file)
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def moai(stand_in, monkeypatch, tmp_path):
+    """Client connected to the moai stand-in, with its own temp dir."""
+    stand_in.route("POST /token", token="token", orgId="org")
+    stand_in.route("GET /validate", message="ok")
+
+    monkeypatch.setenv("MOAI_BASE_URL", stand_in.url)
+    monkeypatch.setenv("MOAI_TEMP_DIR", str(tmp_path))
+
+    from pymoai.client import MoaiClient
+
+    return MoaiClient(email="tech@montops.ai", password="password")
@@ -0,0 +1,35 @@
+"""Test pymoai
+
+Test the conditional request cache.
+"""
+
+
+def test_cache_shared_on_disk(tmp_path):
+    """Test entries written by one worker are visible to another"""
+    from pymoai.cache import ConditionalCache
+
+    writer = ConditionalCache(str(tmp_path))
+    reader = ConditionalCache(str(tmp_path))
+
+    assert reader.get("/datasets") is None
+
+    writer.put("/datasets", '"v1"', {"datasets": []})
+    entry = reader.get("/datasets")
+
+    assert entry is not None
+    assert entry.etag == '"v1"'
+    assert entry.body == {"datasets": []}
+
+
+def test_cache_freshness(tmp_path):
+    """Test entries are only fresh within max age"""
+    from pymoai.cache import ConditionalCache
+
+    cache = ConditionalCache(str(tmp_path), max_age=60)
+    entry = cache.put("/datasets", '"v1"', [])
+
+    assert entry.fresh(cache.max_age)
+    assert not entry.fresh(0)
+
+    entry.fetched_at -= 120
+    assert not entry.fresh(cache.max_age)
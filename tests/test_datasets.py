@@ -34,3 +34,302 @@ def test_upload():
     assert json_res is not None and len(json_res["path"]) > 0
     assert json_res["test_field1"] == "test_value1"
     assert json_res["test_field2"] == "test_value2"
+
+
+def test_row_index_diff(tmp_path):
+    """Test row index only reports rows not uploaded before"""
+    import pandas as pd
+
+    from pymoai.api.incremental import RowIndex
+
+    index = RowIndex("nlp_train.csv", str(tmp_path))
+    df = pd.DataFrame({"id": [1, 2, 3], "text": ["a", "b", "c"]})
+
+    assert not index.exists
+    index.update(index.hash(df))
+    assert index.exists
+
+    grown = pd.DataFrame({"id": [1, 2, 3, 4], "text": ["a", "b", "c", "d"]})
+    unseen = index.unseen(index.hash(grown))
+
+    assert grown[unseen]["id"].tolist() == [4]
+
+    keyed = RowIndex("nlp_train.csv", str(tmp_path / "keyed"), key_columns=["id"])
+    keyed.update(keyed.hash(df))
+    changed = pd.DataFrame({"id": [3, 5], "text": ["changed", "e"]})
+
+    assert changed[keyed.unseen(keyed.hash(changed))]["id"].tolist() == [5]
+
+
+def test_shrunk_dtypes():
+    """Test the smallest lossless dtypes are found without converting columns"""
+    import numpy as np
+    import pandas as pd
+
+    from pymoai.api.dtypes import shrunk_dtypes
+
+    df = pd.DataFrame(
+        {
+            "small": np.arange(100, dtype=np.int64),
+            "wide": np.arange(100, dtype=np.int64) * -1000,
+            "count": np.arange(100, dtype=np.uint64) * 1000,
+            "half": np.arange(100, dtype=np.float64) / 2,
+            "precise": np.linspace(0, 1, 100),
+            "label": ["spam", "ham"] * 50,
+            "text": [f"row {i}" for i in range(100)],
+        }
+    )
+    original = df.copy()
+
+    dtypes = shrunk_dtypes(df)
+
+    assert dtypes == {
+        "small": "int8",
+        "wide": "int32",
+        "count": "uint32",
+        "half": "float32",
+        "precise": "float64",
+        "label": "category",
+        "text": str(df["text"].dtype),
+    }
+    assert df.equals(original)
+    assert df.astype(dtypes).astype(df.dtypes.to_dict()).equals(df)
+
+
+def test_stratified_preview_sample():
+    """Test preview samples keep every target class"""
+    import pandas as pd
+
+    from pymoai.api.uploads import stratified_sample
+
+    df = pd.DataFrame({"x": range(1000), "label": ["a"] * 900 + ["b"] * 95 + ["c"] * 5})
+
+    sample = stratified_sample(df, "label", 100)
+    counts = sample["label"].value_counts()
+
+    assert 95 <= len(sample) <= 105
+    assert counts["a"] == 90
+    assert counts["b"] in (9, 10)
+    assert counts["c"] == 1
+    assert sample.index.is_monotonic_increasing
+
+
+def test_list_and_versions_revalidate(stand_in, moai):
+    """Test listings are cached and revalidated with ETags"""
+    listing = {
+        "datasets": [
+            {
+                "name": "nlp_train",
+                "versions": 2,
+                "latest": {
+                    "version": 2,
+                    "path": "/datasets/nlp_train.csv",
+                    "created": "2023-02-20",
+                },
+            }
+        ]
+    }
+
+    def conditional(payload, etag):
+        def route(req, body):
+            if req.headers.get("If-None-Match") == etag:
+                return 304, {"ETag": etag}, None
+            return 200, {"ETag": etag}, payload
+
+        return route
+
+    stand_in.route("GET /datasets", conditional(listing, '"v2"'))
+    stand_in.route(
+        "GET /datasets/nlp_train/versions",
+        conditional(
+            [
+                {
+                    "version": 1,
+                    "path": "/datasets/nlp_train.csv",
+                    "created": "2023-02-19",
+                    "rows": 10,
+                }
+            ],
+            '"v1"',
+        ),
+    )
+
+    first = moai.datasets.list()
+    second = moai.datasets.list()
+
+    assert first == second
+    assert first[0].name == "nlp_train"
+    assert first[0].latest.version == 2
+    assert [r["headers"].get("If-None-Match") for r in stand_in.requests[-2:]] == [
+        None,
+        '"v2"',
+    ]
+
+    versions = moai.datasets.versions("nlp_train")
+    assert versions[0].rows == 10
+    assert moai.datasets.versions("nlp_train") == versions
+
+
+def test_unexpected_listings_are_rejected(stand_in, moai):
+    """Test listings of an unexpected shape raise instead of being iterated"""
+    import pytest
+
+    from pymoai.exceptions import ApiResponseError
+
+    stand_in.route("GET /datasets", datasets={"name": "nlp_train"})
+    stand_in.route("GET /datasets/nlp_train/versions", lambda req, body: (200, {}, 2))
+
+    with pytest.raises(ApiResponseError):
+        moai.datasets.list()
+    with pytest.raises(ApiResponseError):
+        moai.datasets.versions("nlp_train")
+
+
+def test_incremental_add_sends_new_rows(stand_in, moai):
+    """Test a second incremental upload only sends unseen rows for appending"""
+    import io
+
+    import pandas as pd
+    import pytest
+
+    uploads = []
+
+    def upload(req, body):
+        fields = stand_in.multipart_fields(req, body)
+        uploads.append(
+            {
+                "mode": fields["mode"].decode() if "mode" in fields else None,
+                "df": pd.read_csv(io.BytesIO(fields["file"])),
+            }
+        )
+        return 200, {}, {"path": "/datasets/t.csv"}
+
+    stand_in.route("POST /upload", upload)
+
+    df = pd.DataFrame({"id": [1, 2, 3], "value": ["a", "b", "c"]})
+    moai.datasets.add("t.csv", df=df, incremental=True, key_columns=["id"])
+
+    df = pd.DataFrame({"id": [1, 2, 3, 4], "value": ["a", "b", "c", "d"]})
+    moai.datasets.add("t.csv", df=df, incremental=True, key_columns=["id"])
+
+    assert uploads[0]["mode"] is None
+    assert len(uploads[0]["df"]) == 3
+    assert uploads[1]["mode"] == "append"
+    assert uploads[1]["df"].to_dict("records") == [{"id": 4, "value": "d"}]
+
+    with pytest.raises(ValueError):
+        moai.datasets.add(
+            "t.csv",
+            df=df,
+            incremental=True,
+            key_columns=["id"],
+            exclude_columns=["id"],
+        )
+    assert len(uploads) == 2
+
+    # the same dataset stored in S3 has its own index
+    moai.datasets.add("t.csv", df=df, incremental=True, store_s3=True)
+    assert uploads[2]["mode"] is None
+    assert len(uploads[2]["df"]) == 4
+
+
+def test_incremental_add_ignores_dtype_drift(stand_in, moai):
+    """Test rows read with another dtype are not sent again"""
+    import io
+
+    import pandas as pd
+
+    uploads = []
+
+    def upload(req, body):
+        uploads.append(
+            pd.read_csv(io.BytesIO(stand_in.multipart_fields(req, body)["file"]))
+        )
+        return 200, {}, {"path": "/datasets/t.csv"}
+
+    stand_in.route("POST /upload", upload)
+
+    daily = io.StringIO("id,count\n1,10\n2,20\n")
+    moai.datasets.add("t.csv", df=pd.read_csv(daily), incremental=True)
+
+    # a missing value turns `count` into a float column
+    daily = io.StringIO("id,count\n1,10\n2,20\n3,\n")
+    df = pd.read_csv(daily)
+    assert df["count"].dtype == "float64"
+    moai.datasets.add("t.csv", df=df, incremental=True)
+
+    assert uploads[1]["id"].tolist() == [3]
+
+
+def test_shrink_sends_schema_with_unchanged_data(stand_in, moai):
+    """Test shrinking only adds a schema, the uploaded csv keeps exact values"""
+    import json
+
+    import numpy as np
+    import pandas as pd
+
+    fields = {}
+
+    def upload(req, body):
+        fields.update(stand_in.multipart_fields(req, body))
+        return 200, {}, {"path": "/datasets/t.csv"}
+
+    stand_in.route("POST /upload", upload)
+
+    df = pd.DataFrame({"id": np.arange(10), "x": np.float32(0.1) * np.ones(10)})
+    df["x"] = df["x"].astype(np.float64)
+    moai.datasets.add("t.csv", df=df, shrink=True)
+
+    schema = json.loads(fields["schema"])
+    assert schema["columns"] == {"id": "int8", "x": "float32"}
+    assert schema["rows"] == 10
+    assert fields["file"] == df.to_csv(index=False).encode("utf-8")
+
+
+def test_preview_add(stand_in, moai):
+    """Test previews are sent before the full upload, which is skipped on rejection"""
+    import pandas as pd
+    import pytest
+
+    from pymoai.exceptions import ApiResponseError
+
+    uploads = []
+    status = [200]
+
+    def upload(req, body):
+        fields = stand_in.multipart_fields(req, body)
+        uploads.append(fields)
+        preview = "preview" in fields
+        return status[0] if preview else 200, {}, {"preview": preview}
+
+    stand_in.route("POST /upload", upload)
+
+    df = pd.DataFrame({"id": range(100), "label": ["a", "b"] * 50})
+    moai.datasets.add("t.csv", df=df, target="label", incremental=True)
+
+    more = pd.DataFrame({"id": range(200), "label": ["a", "b"] * 100})
+    handle = moai.datasets.add(
+        "t.csv",
+        df=more,
+        target="label",
+        incremental=True,
+        preview=True,
+        preview_rows=20,
+    )
+
+    assert handle.preview == {"preview": True}
+    assert handle.result(timeout=10) == {"preview": False}
+    assert "mode" not in uploads[1]
+    assert uploads[2]["mode"] == b"append"
+
+    # frames no larger than the sample are uploaded once
+    handle = moai.datasets.add("s.csv", df=df, target="label", preview=True)
+    assert handle.done()
+    assert handle.result() == {"preview": False}
+    assert len(uploads) == 4
+
+    status[0] = 400
+    with pytest.raises(ApiResponseError):
+        moai.datasets.add("u.csv", df=df, target="label", preview=True, preview_rows=20)
+    assert len(uploads) == 5
+    assert "preview" in uploads[4]
@@ -0,0 +1,126 @@
+"""Test pymoai
+
+Test retry policy and circuit breaker.
+"""
+import pytest
+import requests
+
+
+def make_response(status_code: int, headers=None) -> requests.Response:
+    """Build a bare response with the given status."""
+    res = requests.Response()
+    res.status_code = status_code
+    res.headers.update(headers or {})
+    return res
+
+
+def test_retries_transient_errors(monkeypatch):
+    """Test connection errors are retried until success."""
+    from pymoai import retry
+
+    monkeypatch.setattr(retry.time, "sleep", lambda _: None)
+    outcomes = [requests.exceptions.ConnectionError(), make_response(503)]
+
+    def send():
+        if outcomes:
+            outcome = outcomes.pop(0)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+        return make_response(200)
+
+    res = retry.call_with_retry(send, retry.RetryPolicy(max_retries=3))
+
+    assert res.status_code == 200
+    assert outcomes == []
+
+
+def test_no_retry_without_policy():
+    """Test calls without a policy are attempted once."""
+    from pymoai import retry
+
+    calls = []
+
+    def send():
+        calls.append(1)
+        raise requests.exceptions.ConnectionError()
+
+    with pytest.raises(requests.exceptions.ConnectionError):
+        retry.call_with_retry(send)
+
+    assert len(calls) == 1
+
+
+def test_backoff_is_bounded():
+    """Test jittered backoff stays within the exponential ceiling."""
+    from pymoai.retry import RetryPolicy
+
+    policy = RetryPolicy(backoff_factor=1.0, backoff_max=5.0)
+
+    for attempt in range(10):
+        assert 0 <= policy.backoff(attempt) <= min(5.0, 2**attempt)
+
+
+def test_circuit_breaker_fails_fast(monkeypatch):
+    """Test an open breaker short-circuits calls until the reset timeout."""
+    from pymoai import retry
+    from pymoai.exceptions import CircuitOpenError
+
+    now = [0.0]
+    monkeypatch.setattr(retry.time, "monotonic", lambda: now[0])
+
+    breaker = retry.CircuitBreaker(failure_threshold=2, reset_timeout=10.0)
+    calls = []
+
+    def failing():
+        calls.append(1)
+        return make_response(503)
+
+    for _ in range(2):
+        retry.call_with_retry(failing, breaker=breaker)
+
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        retry.call_with_retry(failing, breaker=breaker)
+    assert len(calls) == 2
+
+    now[0] = 11.0
+    assert breaker.state == "half-open"
+
+    res = retry.call_with_retry(lambda: make_response(200), breaker=breaker)
+
+    assert res.status_code == 200
+    assert breaker.state == "closed"
+
+
+def test_non_idempotent_only_retries_unsent(monkeypatch):
+    """Test calls that may have reached the server are not replayed."""
+    from pymoai import retry
+    from pymoai.exceptions import ConnectError
+
+    monkeypatch.setattr(retry.time, "sleep", lambda _: None)
+    policy = retry.RetryPolicy(max_retries=3)
+    outcomes = [ConnectError(), requests.exceptions.ReadTimeout()]
+
+    def send():
+        raise outcomes.pop(0)
+
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        retry.call_with_retry(send, policy, idempotent=False)
+    assert outcomes == []
+
+    res = retry.call_with_retry(lambda: make_response(503), policy, idempotent=False)
+    assert res.status_code == 503
+
+
+def test_non_retryable_server_errors_open_breaker():
+    """Test 5xx statuses outside the forcelist still count as failures."""
+    from pymoai import retry
+
+    breaker = retry.CircuitBreaker(failure_threshold=2, reset_timeout=10.0)
+
+    for _ in range(2):
+        res = retry.call_with_retry(lambda: make_response(500), breaker=breaker)
+        assert res.status_code == 500
+
+    assert breaker.state == "open"
@@ -0,0 +1,270 @@
+"""Test pymoai
+
+Test direct S3 uploads against local moai and S3 stand-ins.
+"""
+import json
+
+import pytest
+
+pytest.importorskip("moto.server")
+
+bucket = "moai-datasets"
+part_size = 5 * 1024 * 1024
+
+
+@pytest.fixture
+def s3_server(monkeypatch):
+    """Local moto server standing in for S3."""
+    from moto.server import ThreadedMotoServer
+
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=0)
+    server.start()
+    host, port = server.get_host_and_port()
+    yield f"http://{host}:{port}"
+    server.stop()
+
+
+@pytest.fixture
+def s3(s3_server):
+    """Boto3 client for the S3 stand-in, as held by the moai server."""
+    import boto3
+
+    client = boto3.client("s3", endpoint_url=s3_server, region_name="us-east-1")
+    client.create_bucket(Bucket=bucket)
+    return client
+
+
+@pytest.fixture(autouse=True)
+def small_parts(monkeypatch):
+    """Use the smallest part size S3 accepts."""
+    monkeypatch.setenv("MOAI_S3_PART_SIZE", str(part_size))
+
+
+def make_df(rows: int):
+    """Dataframe large enough to need several parts."""
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({"x": rng.random(rows), "label": rng.integers(0, 2, rows)})
+
+
+def test_presigned_part_upload(stand_in, moai, s3):
+    """Test parts are PUT straight to S3 and completed on commit"""
+    commits = []
+
+    def grant(req, body):
+        request = json.loads(body)
+        key = request["filename"].lstrip("/")
+        upload_id = s3.create_multipart_upload(Bucket=bucket, Key=key)["UploadId"]
+        parts = -(-request["size"] // request["part_size"])
+        urls = [
+            s3.generate_presigned_url(
+                "upload_part",
+                Params={
+                    "Bucket": bucket,
+                    "Key": key,
+                    "UploadId": upload_id,
+                    "PartNumber": n,
+                },
+            )
+            for n in range(1, parts + 1)
+        ]
+        return (
+            200,
+            {},
+            {
+                "bucket": bucket,
+                "key": key,
+                "upload_id": upload_id,
+                "part_size": request["part_size"],
+                "part_urls": urls,
+            },
+        )
+
+    def commit(req, body):
+        request = json.loads(body)
+        commits.append(request)
+        s3.complete_multipart_upload(
+            Bucket=bucket,
+            Key=request["key"],
+            UploadId=request["upload_id"],
+            MultipartUpload={"Parts": request["parts"]},
+        )
+        return 200, {}, {"path": request["filename"], "pipeline": request["pipeline"]}
+
+    stand_in.route("POST /s3/grant", grant)
+    stand_in.route("POST /s3/commit", commit)
+
+    df = make_df(400_000)
+    res = moai.datasets.add(
+        "train.csv", df=df, store_s3=True, direct_s3=True, pipeline="nightly"
+    )
+
+    assert res == {"path": "/s3/train.csv", "pipeline": "nightly"}
+    assert len(commits[0]["parts"]) > 1
+    assert all(r["path"] != "/upload" for r in stand_in.requests)
+
+    stored = s3.get_object(Bucket=bucket, Key="s3/train.csv")["Body"].read()
+    assert stored == df.to_csv(index=False).encode("utf-8")
+
+
+def test_scoped_credentials_upload(stand_in, moai, s3, s3_server):
+    """Test uploads with scoped credentials use the transfer manager"""
+    stand_in.route(
+        "POST /s3/grant",
+        bucket=bucket,
+        key="s3/train.csv",
+        region="us-east-1",
+        endpoint_url=s3_server,
+        credentials={"AccessKeyId": "scoped", "SecretAccessKey": "scoped"},
+    )
+    stand_in.route(
+        "POST /s3/commit",
+        lambda req, body: (200, {}, {"path": json.loads(body)["filename"]}),
+    )
+
+    df = make_df(400_000)
+    res = moai.datasets.add("train.csv", df=df, store_s3=True, direct_s3=True)
+
+    assert res == {"path": "/s3/train.csv"}
+    stored = s3.get_object(Bucket=bucket, Key="s3/train.csv")["Body"].read()
+    assert stored == df.to_csv(index=False).encode("utf-8")
+
+
+def test_direct_upload_requires_s3(moai):
+    """Test direct uploads are only allowed for S3 datasets"""
+    with pytest.raises(ValueError):
+        moai.datasets.add("train.csv", df=make_df(10), direct_s3=True)
+
+
+def test_failed_part_upload_is_aborted(stand_in, moai):
+    """Test failed parts trip the S3 breaker only, and the upload is aborted"""
+    from pymoai.exceptions import ApiResponseError
+    from pymoai.retry import CircuitBreaker, RetryPolicy
+
+    moai.retry_policy = RetryPolicy(max_retries=0)
+    moai.breaker = CircuitBreaker(failure_threshold=1)
+    moai.datasets.s3.breaker = CircuitBreaker(failure_threshold=1)
+    aborts = []
+
+    def abort(req, body):
+        aborts.append(json.loads(body))
+        return 200, {}, {}
+
+    stand_in.route(
+        "POST /s3/grant",
+        bucket=bucket,
+        key="s3/train.csv",
+        upload_id="upload-1",
+        part_size=part_size,
+        part_urls=[f"{stand_in.url}/part/1"],
+    )
+    stand_in.route("PUT /part/1", lambda req, body: (503, {}, None))
+    stand_in.route("POST /s3/abort", abort)
+
+    with pytest.raises(ApiResponseError):
+        moai.datasets.add("train.csv", df=make_df(10), store_s3=True, direct_s3=True)
+
+    assert aborts == [
+        {
+            "filename": "/s3/train.csv",
+            "bucket": bucket,
+            "key": "s3/train.csv",
+            "upload_id": "upload-1",
+        }
+    ]
+    assert moai.datasets.s3.breaker.state == "open"
+    assert moai.breaker.state == "closed"
+    assert all(r["path"] != "/s3/commit" for r in stand_in.requests)
+
+
+def test_cancel_direct_upload(stand_in, moai):
+    """Test cancelling a background direct upload stops it and aborts the grant"""
+    import threading
+
+    from pymoai.exceptions import UploadCancelledError
+
+    granted = threading.Event()
+    release = threading.Event()
+    aborts = []
+
+    def grant(req, body):
+        granted.set()
+        release.wait(10)
+        return (
+            200,
+            {},
+            {
+                "bucket": bucket,
+                "key": "s3/train.csv",
+                "upload_id": "upload-1",
+                "part_size": part_size,
+                "part_urls": [f"{stand_in.url}/part/1"],
+            },
+        )
+
+    def abort(req, body):
+        aborts.append(json.loads(body))
+        return 200, {}, {}
+
+    stand_in.route("POST /s3/grant", grant)
+    stand_in.route("POST /s3/abort", abort)
+
+    handle = moai.datasets.add(
+        "train.csv",
+        df=make_df(100),
+        store_s3=True,
+        direct_s3=True,
+        preview=True,
+        preview_rows=10,
+    )
+    assert granted.wait(10)
+    assert handle.cancel()
+    release.set()
+
+    with pytest.raises(UploadCancelledError):
+        handle.result(timeout=10)
+    assert aborts[0]["upload_id"] == "upload-1"
+    assert all(r["path"] != "/part/1" for r in stand_in.requests)
+
+
+def test_commit_timeout_is_not_aborted(stand_in, moai):
+    """Test a commit with an unknown outcome is not aborted, a rejected one is"""
+    import time
+
+    import requests
+
+    from pymoai.exceptions import ApiResponseError
+    from pymoai.retry import RetryPolicy
+
+    moai.retry_policy = RetryPolicy(max_retries=0)
+    moai.timeout = (5, 0.2)
+
+    def slow_commit(req, body):
+        time.sleep(1)
+        return 200, {}, {"path": "/s3/train.csv"}
+
+    stand_in.route(
+        "POST /s3/grant",
+        bucket=bucket,
+        key="s3/train.csv",
+        upload_id="upload-1",
+        part_size=part_size,
+        part_urls=[f"{stand_in.url}/part/1"],
+    )
+    stand_in.route("PUT /part/1", lambda req, body: (200, {"ETag": '"etag"'}, None))
+    stand_in.route("POST /s3/commit", slow_commit)
+
+    with pytest.raises(requests.exceptions.Timeout):
+        moai.datasets.add("train.csv", df=make_df(10), store_s3=True, direct_s3=True)
+    assert all(r["path"] != "/s3/abort" for r in stand_in.requests)
+
+    stand_in.route("POST /s3/commit", lambda req, body: (409, {}, {"error": "parts"}))
+    with pytest.raises(ApiResponseError):
+        moai.datasets.add("train.csv", df=make_df(10), store_s3=True, direct_s3=True)
+    assert [r["path"] for r in stand_in.requests][-2:] == ["/s3/commit", "/s3/abort"]
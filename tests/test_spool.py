@@ -0,0 +1,193 @@
+"""Test pymoai
+
+Test the durable upload and command spool.
+"""
+import os
+
+import requests
+
+
+def make_response(status_code: int) -> requests.Response:
+    """Build a bare response with the given status."""
+    res = requests.Response()
+    res.status_code = status_code
+    return res
+
+
+def test_spool_delivers_with_idempotency_key(tmp_path):
+    """Test spooled entries are delivered once accepted, bodies included"""
+    from pymoai.spool import Spool
+
+    spool = Spool(str(tmp_path))
+    delivered = []
+
+    def handler(payload, key):
+        with open(spool.body_path(payload), "rb") as f:
+            delivered.append((payload["filename"], f.read(), key))
+        return make_response(200)
+
+    spool.register("upload", handler)
+    key = spool.put("upload", {"filename": "/datasets/a.csv"}, body=b"a,b\n1,2\n")
+
+    assert spool.pending() == 1
+    assert spool.drain() == 1
+    assert spool.pending() == 0
+    assert delivered == [("/datasets/a.csv", b"a,b\n1,2\n", key)]
+    assert os.listdir(tmp_path / "data") == []
+
+
+def test_spool_keeps_failed_deliveries(tmp_path):
+    """Test transient failures stay pending and rejections move to failed"""
+    from pymoai.spool import Spool
+
+    spool = Spool(str(tmp_path))
+    statuses = {"flaky": [503, 200], "bad": [400]}
+
+    def handler(payload, key):
+        name = payload["args"][0]
+        if name == "down":
+            raise requests.exceptions.ConnectionError()
+        return make_response(statuses[name].pop(0))
+
+    spool.register("command", handler)
+    for name in ("flaky", "bad", "down"):
+        spool.put("command", {"args": [name]})
+
+    assert spool.drain() == 0
+    assert spool.pending() == 2
+    assert len(os.listdir(tmp_path / "failed")) == 1
+
+    assert spool.drain() == 1
+    assert spool.pending() == 1
+
+
+def test_spool_recovers_abandoned_claims(tmp_path):
+    """Test entries claimed by a dead drainer are delivered again"""
+    from pymoai.spool import Spool
+
+    spool = Spool(str(tmp_path), lease_timeout=60)
+    spool.register("command", lambda payload, key: make_response(200))
+    spool.put("command", {"args": ["list"]})
+
+    # simulate a drainer that claimed the entry and died
+    (name,) = os.listdir(tmp_path / "pending")
+    inflight = tmp_path / "inflight" / name
+    os.rename(tmp_path / "pending" / name, inflight)
+    os.utime(inflight, (0, 0))
+
+    assert spool.drain() == 1
+    assert spool.pending() == 0
+
+
+def test_spool_isolates_handler_errors(tmp_path):
+    """Test a failing handler does not stop the batch, and 401s stay pending"""
+    from pymoai.spool import Spool
+
+    renewed = []
+    spool = Spool(str(tmp_path), reauthenticate=lambda: renewed.append(1))
+
+    def handler(payload, key):
+        name = payload["args"][0]
+        if name == "broken":
+            raise OSError("body missing")
+        return make_response({"ok": 200, "expired": 401}[name])
+
+    spool.register("command", handler)
+    for name in ("broken", "ok", "expired"):
+        spool.put("command", {"args": [name]})
+
+    assert spool.drain() == 1
+    assert spool.pending() == 1
+    assert len(os.listdir(tmp_path / "failed")) == 1
+    assert renewed == [1]
+    assert os.listdir(tmp_path / "inflight") == []
+
+
+def test_spool_renews_lease_while_delivering(tmp_path):
+    """Test slow deliveries keep their claim fresh"""
+    import time
+
+    from pymoai.spool import Spool
+
+    spool = Spool(str(tmp_path), lease_timeout=0.3)
+    ages = []
+
+    def handler(payload, key):
+        time.sleep(0.6)
+        (name,) = os.listdir(tmp_path / "inflight")
+        ages.append(time.time() - os.path.getmtime(tmp_path / "inflight" / name))
+        return make_response(200)
+
+    spool.register("command", handler)
+    spool.put("command", {"args": ["slow"]})
+
+    assert spool.drain() == 1
+    assert ages[0] < 0.3
+
+
+def test_spooled_incremental_indexes_on_delivery(stand_in, moai):
+    """Test spooled incremental uploads only index rows the server accepted"""
+    import pandas as pd
+
+    from pymoai.client import MoaiClient
+
+    statuses = [401, 200]
+    stand_in.route("POST /upload", lambda req, body: (statuses.pop(0), {}, {}))
+
+    client = MoaiClient(email="tech@montops.ai", password="password", spool=True)
+    client.spool.stop()
+    try:
+        df = pd.DataFrame({"id": [1, 2, 3]})
+        client.datasets.add("t.csv", df=df, incremental=True, spool=True)
+        index = client.datasets.row_index("/datasets/t.csv")
+
+        assert client.spool.drain() == 0
+        assert index.load().size == 0
+
+        assert client.spool.drain() == 1
+        assert index.load().size == 3
+    finally:
+        client.close()
+
+
+def test_spooled_incremental_counts_staged_rows(stand_in, moai):
+    """Test pending spooled rows are not spooled again, and rejected rows are freed"""
+    import io
+
+    import pandas as pd
+
+    from pymoai.client import MoaiClient
+
+    uploads = {}
+
+    def upload(req, body):
+        fields = stand_in.multipart_fields(req, body)
+        mode = fields.get("mode")
+        uploads[mode] = pd.read_csv(io.BytesIO(fields["file"]))
+        # entries are delivered concurrently, so the append is rejected by mode
+        return (400 if mode == b"append" else 200), {}, {}
+
+    stand_in.route("POST /upload", upload)
+
+    client = MoaiClient(email="tech@montops.ai", password="password", spool=True)
+    client.spool.stop()
+    try:
+        client.datasets.add(
+            "t.csv", df=pd.DataFrame({"id": [1, 2]}), incremental=True, spool=True
+        )
+        client.datasets.add(
+            "t.csv", df=pd.DataFrame({"id": [1, 2, 3]}), incremental=True, spool=True
+        )
+
+        assert client.spool.drain() == 1
+        assert uploads[None]["id"].tolist() == [1, 2]
+        assert uploads[b"append"]["id"].tolist() == [3]
+
+        # the rejected row was discarded from the index, so it is sent again
+        index = client.datasets.row_index("/datasets/t.csv")
+        assert index.unseen(index.hash(pd.DataFrame({"id": [1, 3]}))).tolist() == [
+            False,
+            True,
+        ]
+    finally:
+        client.close()
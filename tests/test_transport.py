@@ -0,0 +1,142 @@
+"""Test pymoai
+
+Test pluggable http transports against a local stand-in server. The http2 transport
+is tested against a stand-in speaking only HTTP/2 over TLS, since httpx does not speak
+h2 over plain http.
+"""
+import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+
+backends = ["requests", "urllib3", "http2"]
+
+
+def make(name):
+    """Create a transport, skipping if its optional dependency is missing."""
+    from pymoai.transport import make_transport
+
+    if name == "http2":
+        pytest.importorskip("httpx")
+    return make_transport(name)
+
+
+@pytest.fixture
+def server(request, name):
+    """Stand-in for the transport under test, speaking h2 for the http2 transport."""
+    return request.getfixturevalue("h2_stand_in" if name == "http2" else "stand_in")
+
+
+@pytest.mark.parametrize("name", backends)
+def test_json_roundtrip(server, name):
+    """Test json requests and responses"""
+    server.route("POST /moai/", lambda req, body: (200, {}, {"echo": body.decode()}))
+    transport = make(name)
+
+    res = transport.request(
+        "POST",
+        f"{server.url}/moai/",
+        headers={"X-Org-Id": "org"},
+        json={"args": ["metastore", "list"]},
+        timeout=(5, 5),
+    )
+
+    assert res.ok
+    assert res.headers["content-type"] == "application/json"
+    assert res.json() == {"echo": '{"args": ["metastore", "list"]}'}
+    assert server.requests[-1]["headers"]["X-Org-Id"] == "org"
+    transport.close()
+
+
+@pytest.mark.parametrize("name", backends)
+def test_streamed_multipart_upload(server, name):
+    """Test multipart encoders are streamed with their length"""
+    from requests_toolbelt.multipart.encoder import MultipartEncoder
+
+    transport = make(name)
+    payload = b"a,b\n" + b"1,2\n" * 100_000
+    e = MultipartEncoder(fields={"file": ("data.csv", io.BytesIO(payload), "text/csv")})
+
+    res = transport.request(
+        "POST",
+        f"{server.url}/upload",
+        data=e,
+        headers={"Content-Type": e.content_type},
+        timeout=(5, 5),
+    )
+
+    assert res.ok
+    assert res.json()["size"] == e.len
+    transport.close()
+
+
+@pytest.mark.parametrize("name", backends)
+def test_errors_map_to_requests_exceptions(server, name):
+    """Test transport failures surface as requests exceptions"""
+
+    def slow(req, body):
+        time.sleep(1)
+        return 200, {}, {}
+
+    server.route("GET /slow", slow)
+    transport = make(name)
+
+    from pymoai.exceptions import ConnectError
+
+    with pytest.raises(requests.exceptions.Timeout) as e:
+        transport.request("GET", f"{server.url}/slow", timeout=(5, 0.2))
+    assert not isinstance(e.value, ConnectError)
+
+    with pytest.raises(ConnectError):
+        transport.request("GET", "http://127.0.0.1:9/", timeout=(1, 1))
+
+    res = transport.request("GET", f"{server.url}/missing", timeout=(5, 5))
+    assert res.ok
+
+    transport.close()
+
+
+def test_http2_multiplexes_one_connection(h2_stand_in):
+    """Test concurrent http2 calls are in flight together on a single connection"""
+    calls = 4
+    barrier = threading.Barrier(calls, timeout=5)
+
+    def together(req, body):
+        barrier.wait()
+        return 200, {}, {}
+
+    h2_stand_in.route("GET /together", together)
+    transport = make("http2")
+    transport.request("GET", f"{h2_stand_in.url}/warmup", timeout=(5, 5))
+
+    url = f"{h2_stand_in.url}/together"
+    with ThreadPoolExecutor(calls) as pool:
+        futures = [
+            pool.submit(transport.request, "GET", url, timeout=(5, 10))
+            for _ in range(calls)
+        ]
+        assert all(f.result().ok for f in futures)
+
+    seen = h2_stand_in.requests
+    assert {r["connection"] for r in seen} == {1}
+    assert len({r["stream"] for r in seen}) == calls + 1
+    transport.close()
+
+
+def test_transport_is_abstract():
+    """Test transports must implement request"""
+    from pymoai.transport import Transport
+
+    with pytest.raises(TypeError):
+        Transport()
+
+
+def test_unknown_transport():
+    """Test unknown transport names are rejected"""
+    from pymoai.transport import make_transport
+
+    with pytest.raises(ValueError):
+        make_transport("carrier-pigeon")